@@ -1,5 +1,8 @@
-from .recursive import (StaticRecFunc, RecFunc,
-						 RecObject, alias, cycle, 
+from .recursive import (StaticRecFunc, RecFunc, RecMapError,
+						 RecObject, SlotRecObject, alias, memoalias, cycle, 
 						 build_rec_class, build_hierarchy, 
-						 add_instances, add_recclass
+						 add_instances, add_recclass, 
+						 save_snapshot, load_snapshot, RecSnapshot, SharedParameters, 
+						 LookupProfiler, set_threadsafe, read_transaction, evict_copies, copy_cache_info, 
+						 RecChange, batch_changes, RecColumns
 						 )
\ No newline at end of file
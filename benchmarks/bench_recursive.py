@@ -0,0 +1,328 @@
+""" Benchmarks of the recursive module
+
+Each benchmark runs in its own process, it reports the best time per call
+over several timeit repeats and the peak memory used by its setup and runs.
+
+    python benchmarks/bench_recursive.py                    # run all
+    python benchmarks/bench_recursive.py getitem clone      # run benchmarks matching names
+    python benchmarks/bench_recursive.py --save baseline.json
+    python benchmarks/bench_recursive.py --compare benchmarks/baseline.json
+
+With --compare, the ratio to the baseline is printed and the exit status is 1
+if one benchmark is slower than the baseline by more than its tolerance 
+(--tolerance or the wider tolerance of the sub-microsecond benchmarks), or 
+if a benchmark is not faster than the one it is compared to in the same 
+run by the expected ratio (see `ratio`).
+A benchmark using a feature missing in the tree is reported as unsupported,
+so the same script records the baseline on older trees:
+
+    python benchmarks/bench_recursive.py --root /path/to/old/tree --save old.json
+
+benchmarks/baseline.json is recorded on the tree before the performance work, 
+the benchmarks of features added since are recorded on the commit adding them
+("source" entry).
+"""
+from __future__ import division, absolute_import, print_function
+import os
+import sys
+import json
+import timeit
+import argparse
+import multiprocessing
+
+def _root(argv):
+    """ directory of the recursive module, --root argument or the parent of benchmarks/ """
+    for i, arg in enumerate(argv):
+        if arg == "--root" and i+1 < len(argv):
+            return argv[i+1]
+        if arg.startswith("--root="):
+            return arg.split("=", 1)[1]
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.abspath(_root(sys.argv)))
+import recursive as rec
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+BENCHMARKS = []
+## timing ratio of fast benchmarks varies more between runs
+FAST_TOLERANCE = 1.6
+FAST_TIME = 5e-6
+
+def benchmark(name, number, tolerance=None):
+    """ register a benchmark, the decorated function returns the callable to time 
+
+    tolerance is the slowdown ratio accepted for this benchmark, by default 
+    --tolerance or FAST_TOLERANCE for the benchmarks faster than FAST_TIME
+    """
+    def decorator(setup):
+        BENCHMARKS.append((name, number, tolerance, setup))
+        return setup
+    return decorator
+
+RATIOS = []
+
+def ratio(name, reference, maximum):
+    """ register a check: `name` must take at most maximum times the time of 
+    `reference` in the same run, e.g. the gain of a batched path over the 
+    path it replaces. Timing noise affects both, unlike a baseline ratio.
+    """
+    RATIOS.append((name, reference, maximum))
+
+class Unsupported(Exception):
+    pass
+
+
+##########################################################
+#
+# Helpers building the hierarchies
+#
+##########################################################
+
+def deep_class(depth):
+    """ RecObject subclass with `depth` class parameter layers """
+    cl = rec.RecObject
+    for i in range(depth):
+        cl = type("Depth%d"%i, (cl,), {"parameters":{"k%d"%i:i}})
+    return cl
+
+def tree_class(ndet=20, namp=10):
+    return rec.build_rec_class("Top", [("Det", list(range(ndet))), ("Amp", list(range(namp)))])
+
+def filled_tree(ndet=20, namp=10, nkeys=10):
+    tree = tree_class(ndet, namp)()
+    for d in tree.iter_det():
+        for a in d.iter_amp():
+            for k in range(nkeys):
+                a["key%d"%k] = k
+    return tree
+
+def flat_records(ndet=20, namp=10, nkeys=10):
+    """ the records of filled_tree as yielded by iterdeploy """
+    return [(".det%d.amp%d[key%d]"%(d, a, k), k) 
+            for d in range(ndet) for a in range(namp) for k in range(nkeys)]
+
+
+##########################################################
+#
+# Benchmarks
+#
+##########################################################
+
+for _depth in (1, 10, 40):
+    def _hit(depth=_depth):
+        obj = deep_class(depth)()
+        return lambda: obj["k0"]
+    benchmark("getitem_hit_depth%d"%_depth, 100000)(_hit)
+
+    def _miss(depth=_depth):
+        obj = deep_class(depth)()
+        def run():
+            try:
+                obj["missing"]
+            except KeyError:
+                pass
+        return run
+    benchmark("getitem_miss_depth%d"%_depth, 100000)(_miss)
+
+@benchmark("getitem_blocked", 100000)
+def _blocked():
+    class Parent(deep_class(20)):
+        class Child(rec.RecObject):
+            parameters = {"x":0}
+        child = Child()
+    parent = Parent(x=1)
+    child = parent.child
+    child.block(*("b%d"%i for i in range(30)))
+    child.block("x")
+    return lambda: child["x"]
+
+@benchmark("get_first_binding", 5000)
+def _first_binding():
+    class Parent(rec.RecObject):
+        class Child(rec.RecObject):
+            pass
+        child = Child()
+    def run():
+        return Parent(x=1).child
+    return run
+
+@benchmark("get_repeated_binding", 100000)
+def _repeated_binding():
+    class Parent(rec.RecObject):
+        class Child(rec.RecObject):
+            pass
+        child = Child()
+    parent = Parent(x=1)
+    return lambda: parent.child
+
+@benchmark("recfunc_call", 50000)
+def _recfunc_call():
+    class Obj(rec.RecObject):
+        parameters = {"a":1, "b":2, "c":3, "d":4}
+        @rec.RecFunc
+        def f(self, a, b, c=0, d=0, e=0):
+            return a
+    obj = Obj()
+    return lambda: obj.f()
+
+@benchmark("clone", 200)
+def _clone():
+    tree = filled_tree(10, 10, 5)
+    return tree.clone
+
+@benchmark("deploy", 20)
+def _deploy():
+    tree = filled_tree()
+    return tree.deploy
+
+@benchmark("iterdeploy", 20)
+def _iterdeploy():
+    tree = filled_tree()
+    return lambda: list(tree.iterdeploy())
+
+@benchmark("propagate", 10)
+def _propagate():
+    records = dict(flat_records())
+    Tree = tree_class()
+    return lambda: Tree().propagate(records)
+
+@benchmark("bulk_propagate", 10)
+def _bulk_propagate():
+    records = flat_records()
+    Tree = tree_class()
+    return lambda: Tree().bulk_propagate(records)
+
+## bulk_propagate looks the keys up once per child and layer, propagate key by key
+ratio("bulk_propagate", "propagate", 0.6)
+
+@benchmark("build_rec_class", 5)
+def _build_rec_class():
+    return lambda: tree_class(200, 50)
+
+@benchmark("add_instances", 5)
+def _add_instances():
+    class Child(rec.RecObject):
+        pass
+    def run():
+        Parent = type("Parent", (rec.RecObject,), {})
+        rec.add_instances(Parent, "Child", Child, list(range(10000)))
+    return run
+
+
+##########################################################
+#
+# Runner
+#
+##########################################################
+
+def _rss_kb():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _measure(setup, number, repeat):
+    """ return (seconds per call, peak memory in KB) """
+    if tracemalloc:
+        tracemalloc.start()
+    rss0 = _rss_kb()
+
+    try:
+        run = setup()
+        run()
+    except AttributeError as e:
+        raise Unsupported(str(e))
+    best = min(timeit.Timer(run).repeat(repeat, number))/number
+
+    if tracemalloc:
+        peak = tracemalloc.get_traced_memory()[1]/1024.
+        tracemalloc.stop()
+    else:
+        peak = _rss_kb()-rss0
+    return best, peak
+
+def _child(queue, setup, number, repeat):
+    try:
+        queue.put(_measure(setup, number, repeat))
+    except Exception as e:
+        queue.put(e)
+
+def run_benchmark(setup, number, repeat=7):
+    """ run one benchmark in a new process, return (seconds per call, peak KB) """
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_child, args=(queue, setup, number, repeat))
+    p.start()
+    result = queue.get()
+    p.join()
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="recursive benchmarks")
+    parser.add_argument("names", nargs="*", help="run only benchmarks containing one of these names")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--root", help="directory of the recursive module to benchmark")
+    parser.add_argument("--save", help="save the results in this json file")
+    parser.add_argument("--compare", help="compare the results to this json baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="slowdown ratio above which a benchmark is a regression, "
+                             "%.2f for benchmarks faster than %gus"%(FAST_TOLERANCE, FAST_TIME*1e6))
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print("%-24s %12s %12s %8s"%("benchmark", "time/call", "peak KB", "ratio"))
+    for name, number, tolerance, setup in BENCHMARKS:
+        if args.names and not any(n in name for n in args.names):
+            continue
+        try:
+            t, peak = run_benchmark(setup, number, args.repeat)
+        except Unsupported:
+            print("%-24s %12s"%(name, "unsupported"))
+            continue
+        results[name] = {"time":t, "peak_kb":peak}
+        ratio = ""
+        if name in baseline:
+            base = baseline[name]["time"]
+            if tolerance is None:
+                tolerance = FAST_TOLERANCE if base < FAST_TIME else args.tolerance
+            r = t/base
+            ratio = "%.2f"%r
+            if r > tolerance:
+                regressions.append(name)
+                ratio += " !"
+        print("%-24s %10.2fus %12.0f %8s"%(name, t*1e6, peak, ratio))
+
+    for name, reference, maximum in RATIOS:
+        if name in results and reference in results:
+            r = results[name]["time"]/results[reference]["time"]
+            failed = r > maximum
+            print("%-24s %10.2f  max %.2f %s"%(name+"/"+reference, r, maximum, "!" if failed else ""))
+            if failed:
+                regressions.append(name+"/"+reference)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if regressions:
+        print("regressions: %s"%", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
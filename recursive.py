@@ -2,7 +2,32 @@ from __future__ import division, absolute_import, print_function
 import weakref
 import inspect
 import copy
+import sys
+import gc
+import struct
+import mmap
+import pickle
+import time
+import threading
+from collections import namedtuple, OrderedDict, KeysView, ValuesView, ItemsView
+from itertools import chain
+try:
+    import reprlib
+except ImportError:
+    import repr as reprlib
+import os
+import re
+import platform
+import tempfile
 from glob import fnmatch, has_magic
+try:
+    from multiprocessing import shared_memory as _shared_memory
+except ImportError:
+    _shared_memory = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class SubstitutionError(RuntimeError):
@@ -16,6 +41,7 @@ class ArgSpec(object):
         self.anykwargs = anykwargs
         self.anyposargs = anyposargs
         self.mendatories = set()
+        self._binders = {}
 
     def substitute_args(self, obj, args, kwargs, offset=0):
         """ substitute the args list and kwargs dict from a called object 
@@ -23,41 +49,11 @@ class ArgSpec(object):
         Everythin not found in args or kwargs is replaced by obj[key]
         Raise an error if some positional argument is missing.
         """
-        fargs = list(self.args[offset:])        
-        args = list(args)
-        if self.anyposargs:
-            pass
-        else:    
-            for a,v in zip(self.args[offset:self.nposargs], args):
-                fargs.remove(a)
-            for i,a in enumerate(self.args[len(args)+offset:self.nposargs],start=len(args)+offset):
-                try:
-                    v = obj[a]
-                except KeyError:                    
-                    raise SubstitutionError("Can't substitute the #%d positional argument with key %r"%(i,a))
-                    
-                fargs.remove(a)                         
-                args.append(v)   
-
-        if self.anykwargs:
-            allkwargs = dict(**obj)            
-            kwargs = dict(allkwargs, **kwargs)
-
-        else:                      
-            for a,v in kwargs.iteritems():
-                try:
-                    fargs.remove(a)
-                except ValueError:
-                    pass
-
-            for a in fargs:
-                try:
-                    v = obj[a]
-                except KeyError:                    
-                    pass                
-                else:
-                    kwargs[a] = v
-        return tuple(args), kwargs
+        try:
+            binder = self._binders[offset]
+        except KeyError:
+            binder = self._binders.setdefault(offset, ArgBinder(self, offset))
+        return binder.bind(obj, args, kwargs)
 
     @classmethod
     def from_recargs(cl, *args, **kwargs):
@@ -128,50 +124,291 @@ class ArgSpec(object):
         return cl(nposargs, args, anyposargs, anykwargs, mendatories=mendatories)
      
 
+class ArgBinder(object):
+    """ ArgSpec compiled for a given offset 
+
+    The names of positional and keyword slots are precomputed so a call does 
+    one obj[key] lookup per missing argument only. 
+    Arguments given positionaly are never substituted as keywords. When the function 
+    accepts any keywords, only its named arguments are taken from obj, other 
+    keywords are the ones of the call. 
+    """
+    __slots__ = ("offset", "npos", "names", "tails")
+    def __init__(self, argspec, offset=0):
+        self.offset = offset
+        self.names = tuple(argspec.args[offset:])
+        self.npos = 0 if argspec.anyposargs else max(argspec.nposargs-offset, 0)
+        ## keyword names to substitute indexed by the number of positional arguments
+        self.tails = tuple(self.names[i:] for i in range(len(self.names)+1))
+
+    def bind(self, obj, args, kwargs):
+        """ return the (args, kwargs) completed from obj """
+        n = len(args)
+        if n < self.npos:
+            args = list(args)
+            for i in range(n, self.npos):
+                a = self.names[i]
+                try:
+                    args.append(obj[a])
+                except KeyError:                    
+                    raise SubstitutionError("Can't substitute the #%d positional argument with key %r"%(i+self.offset,a))
+            args = tuple(args)
+            n = self.npos
+        elif not isinstance(args, tuple):
+            args = tuple(args)        
+
+        tails = self.tails 
+        for a in tails[n if n<len(tails) else -1]:
+            if a in kwargs:
+                continue
+            try:
+                kwargs[a] = obj[a]
+            except KeyError:                    
+                pass
+        return args, kwargs
+
+
+##
+# generation counter incremented by any modification of a layer dictionary or 
+# of a blocked set. A RecObject lookup cache stamped with the current 
+# generation is valid without checking its layers.
+_lookup_generation = [0]
+
+class RecDict(dict):
+    """ dictionary used as a layer of the RecObject __imro__ 
+
+    Each modification increments the layer __version__ and the global lookup 
+    generation so the RecObject lookup caches can be invalidated.
+    The class parameters dictionaries are turned into RecDict when the first 
+    instance is created.
+    """
+    __slots__ = ("__version__",)
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.__version__ = 0
+
+    def _touch(self):
+        self.__version__ += 1
+        _lookup_generation[0] += 1
 
+    def __setitem__(self, item, value):
+        dict.__setitem__(self, item, value)
+        self._touch()
 
-class BaseRecObject(object):
+    def __delitem__(self, item):
+        dict.__delitem__(self, item)
+        self._touch()
 
-    parameters = {}
-    sharedparameters = {}
-    prototypes = {}
-    """ Class parameters """
-    blocked = set()
-    """ A set of blocked keywords, they will not be taken from parents """
-    __imro__ = tuple()
-    __imro_slices__ = (slice(0,0), slice(0,0), slice(0,0))
-    __iid__  = None
-    recursive = True
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._touch()
 
-    def __init__(self, __d__={}, **kwargs):
+    def setdefault(self, item, value=None):
+        if item in self:
+            return dict.__getitem__(self, item)
+        self[item] = value
+        return value
+
+    def pop(self, *args):
+        v = dict.pop(self, *args)
+        self._touch()
+        return v
+
+    def popitem(self):
+        v = dict.popitem(self)
+        self._touch()
+        return v
+
+    def clear(self):
+        dict.clear(self)
+        self._touch()
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+class _LookupCache(object):
+    """ resolution cache of a RecObject: item -> (layer, value) or None if missing 
+
+    `local` is the instance+class part of the __imro__ used to look up the blocked items
+    `positions` maps the id of a layer to its first index in the imro.
+    The entries cover the versioned layers found before the first unversioned 
+    one (e.g. a SharedParameters written by other processes), `stamp` has 
+    their versions. The layers from the unversioned one, `tail` and 
+    `local_tail`, are walked at each read when the item is not found before.
+    """
+    __slots__ = ("imro", "local", "stamp", "blocked", "generation", "items", "positions",
+                 "head", "tail", "local_head", "local_tail")
+    def __init__(self, imro, local, stamp, blocked, generation):
+        self.imro = imro
+        self.local = local
+        self.stamp = stamp
+        self.blocked = blocked
+        self.generation = generation
+        self.items = {}
+        self.positions = None
+        if imro is not None:
+            n = len(stamp)
+            self.head, self.tail = imro[:n], imro[n:]
+            self.local_head, self.local_tail = local[:n], local[n:]
+
+    def invalidate(self, stamp):
+        """ drop the entries which can be affected by the layers whose version changed 
+
+        An item found before the first changed layer is still valid, an item 
+        found after it or missing is still valid if the changed layers do not 
+        have it.
+        """
+        imro = self.imro
+        changed = [n for n, (old, new) in enumerate(zip(self.stamp, stamp)) if old != new]
+        self.stamp = stamp
+        if not changed:
+            return
+        positions = self.positions
+        if positions is None:
+            positions = self.positions = {}
+            for n, layer in enumerate(imro):
+                positions.setdefault(id(layer), n)
+        first = changed[0]
+        layers = [imro[n] for n in changed]
+        items = self.items
+        for item, found in list(items.items()):
+            if found is not None:
+                n = positions[id(found[0])]
+                if n < first:
+                    continue
+                if n in changed:
+                    del items[item]
+                    continue
+            for layer in layers:
+                if item in layer:
+                    del items[item]
+                    break
+
+def _imro_stamp(imro):
+    """ tuple of the layer versions, up to the first layer which is not versioned """
+    try:
+        return tuple([d.__version__ for d in imro])
+    except AttributeError:
+        stamp = []
+        for d in imro:
+            try:
+                stamp.append(d.__version__)
+            except AttributeError:
+                break
+        return tuple(stamp)
+
+def _layers_lookup(imro, keys):
+    """ {key: (layer, value)} of the keys found in the imro layers, first found """
+    found = {}
+    for layer in imro:
+        if not keys:
+            break
+        if isinstance(layer, dict):
+            hits = [(key, (layer, layer[key])) for key in keys if key in layer]
+        else:
+            hits = [(key, f) for key, f in ((key, _chain_lookup((layer,), key)) for key in keys) 
+                    if f is not None]
+        if hits:
+            found.update(hits)
+            keys = [key for key in keys if key not in found]
+    return found
+
+def _chain_lookup(imro, item):
+    """ walk the imro layers and return (layer, value) or None if not found """
+    for obj in imro:
+        try:
+            return obj, obj[item]                
+        except KeyError:
+            pass                               
+    return None
+
+def _as_layer(cl, name):
+    """ return the class own `name` dictionary as a RecDict, KeyError if not defined """
+    p = cl.__dict__[name]
+    if not isinstance(p, RecDict):
+        p = RecDict(p)
+        type.__setattr__(cl, name, p)
+    return p
+
+
+class RecObjectType(type):
+    """ Metaclass of RecObject 
+
+    Collect once per class the class part of the __imro__ (the `parameters` 
+    dictionaries along the class __mro__) and the merged `sharedparameters`.
+    They are recomputed for the class and its subclasses when `parameters` or 
+    `sharedparameters` is reassigned.
+    """
+    def __init__(cl, name, bases, attrs):
+        super(RecObjectType, cl).__init__(name, bases, attrs)
+        cl._collect_layers()
+
+    def _collect_layers(cl):
         __imro__ = []
         shared = {}
-        #####
-        # collect the class definition 
-        # will be done in a metaclass in the future 
-        for sub in self.__class__.__mro__:
+        for sub in cl.__mro__:
             if isinstance(sub, type):            
                 try:
-                    p = sub.__dict__["parameters"]
-                    #p = getattr(sub, "parameters")
-                except KeyError:#AttributeError:
+                    p = _as_layer(sub, "parameters")
+                except KeyError:
                     pass
                 else:                
                     __imro__.append(p)
 
                 try:
                     p = sub.__dict__["sharedparameters"]
-                    #p = getattr(sub, "parameters")
-                except KeyError:#AttributeError:
+                except KeyError:
                     pass
                 else:                
                     for k,v in p.iteritems():
                         shared.setdefault(k,v)    
+        type.__setattr__(cl, "__class_imro__", tuple(__imro__))
+        type.__setattr__(cl, "__class_shared__", shared)
+
+    def __setattr__(cl, name, value):
+        old = cl.__dict__.get(name)
+        type.__setattr__(cl, name, value)
+        if name in ("parameters", "sharedparameters"):
+            todo = [cl]
+            while todo:
+                sub = todo.pop()
+                sub._collect_layers()
+                todo.extend(type.__subclasses__(sub))
+        elif isinstance(value, (RecObject, LazyRecChild)) or isinstance(old, (RecObject, LazyRecChild)):
+            _forget_children(cl)
+
+    def __delattr__(cl, name):
+        old = cl.__dict__.get(name)
+        type.__delattr__(cl, name)
+        if isinstance(old, (RecObject, LazyRecChild)):
+            _forget_children(cl)
+
+
+class BaseRecObject(object):
+    __metaclass__ = RecObjectType
+
+    parameters = {}
+    sharedparameters = {}
+    prototypes = {}
+    """ Class parameters """
+    blocked = set()
+    """ A set of blocked keywords, they will not be taken from parents """
+    __imro__ = tuple()
+    __imro_slices__ = (slice(0,0), slice(0,0), slice(0,0))
+    __iid__  = None
+    __lookup__ = _LookupCache(None, None, None, None, -1)
+    recursive = True
+    maxcopies = None
+    """ Size of a child copy store above which its unused copies are evicted, None for no limit 
+    (CPython only, see evict_copies) """
 
+    def __init__(self, __d__={}, **kwargs):
+        cl = self.__class__
         ##
         # __imro__ is composed of instance dictionaries, class parameters dictionary and
         # parent dictionaries    
-        self.__imro__ = (shared,)+tuple(__imro__)
+        self.__imro__ = (RecDict(cl.__class_shared__),)+cl.__class_imro__
 
         # record the number of imro when the object has been initialized 
         # first  slice __imro__ of instance 
@@ -186,25 +423,59 @@ class BaseRecObject(object):
         self.__iid__ = id(self)
         ##
         # update the __imro__[0] (this instance)        
-        self.blocked = set(self.blocked)
-        self.prototypes = dict(self.prototypes)
+        self._init_containers()
         #self.locals.update(__d__, **kwargs)
         for k,v in kwargs.iteritems():
             self[k] = v
 
+    def _init_containers(self):
+        """ give to the instance its own blocked set and prototypes dictionary """
+        self.blocked = set(self.blocked)
+        self.prototypes = dict(self.prototypes)
+
     def __gettrueitem__(self, item):
-        if item in self.blocked:
-            ## blocked item concerned only the instance and class dictionaries 
-            imro = self.__imro__[self.__imro_slices__[0]]+self.__imro__[self.__imro_slices__[1]]
+        lookup = self.__lookup__
+        if lookup.generation != _lookup_generation[0] or lookup.imro is not self.__imro__:
+            lookup = self._refresh_lookup()
+        try:
+            found = lookup.items[item]
+        except KeyError:
+            generation = lookup.generation
+            found = _chain_lookup(lookup.local_head if item in self.blocked else lookup.head, item)
+            lookup.items[item] = found
+            ## a write during the walk may have made found stale, and an 
+            ## other reader may already have refreshed the cache for it 
+            if generation != lookup.generation or generation != _lookup_generation[0]:
+                lookup.items.pop(item, None)
+        if found is None:
+            tail = lookup.local_tail if item in self.blocked else lookup.tail
+            if tail:
+                found = _chain_lookup(tail, item)
+            if found is None:
+                raise KeyError("%r"%item)
+        return found
+
+    def _refresh_lookup(self):
+        """ check the layer versions and return a valid lookup cache """
+        generation = _lookup_generation[0]
+        imro = self.__imro__
+        stamp = _imro_stamp(imro)
+        lookup = self.__lookup__
+        if (lookup.imro is imro and lookup.stamp is not None 
+            and lookup.blocked == self.blocked):
+            if lookup.stamp != stamp:
+                lookup.invalidate(stamp)
+            lookup.generation = generation
         else:
-            imro = self.__imro__
-
-        for obj in imro:
-            try:
-                return obj, obj[item]                
-            except KeyError:
-                pass                               
-        raise KeyError("%r"%item)    
+            if lookup.imro is imro:
+                local = lookup.local
+            else:
+                ## blocked item concerned only the instance and class dictionaries 
+                sls = self.__imro_slices__
+                local = imro[sls[0]]+imro[sls[1]]
+            lookup = _LookupCache(imro, local, stamp, frozenset(self.blocked), generation)
+            self.__lookup__ = lookup
+        return lookup
 
     def __getitem__(self, item):
         """ 
@@ -233,20 +504,70 @@ class BaseRecObject(object):
         obj[key] = value -> set the value transformed eventualy by __rec_set__
         obj[key,] = value  -> set the true value object 
         """
-        
+        if _subscriptions[0]:
+            with _ChangeWatch(self, (item[0] if isinstance(item, tuple) else item,)):
+                self._setitem(item, value)
+        else:
+            self._setitem(item, value)
+
+    def _write_lookup(self, item):
+        """ (layer, value) of item or None, used before a write 
+
+        The lookup cache is used only if it is valid, it is not refreshed as 
+        the write invalidates it again.
+        """
+        lookup = self.__lookup__
+        imro = self.__imro__
+        if lookup.generation == _lookup_generation[0] and lookup.imro is imro:
+            found = lookup.items.get(item)
+            if found is not None or (not lookup.tail and item in lookup.items):
+                return found
+        if item in self.blocked:
+            sls = self.__imro_slices__
+            imro = imro[sls[0]]+imro[sls[1]]
+        return _chain_lookup(imro, item)
+
+    def _write_lookups(self, keys):
+        """ {key: (layer, value)} of the keys found, used before a batch of writes 
+
+        The valid lookup cache entries are taken first, the other keys are 
+        looked for layer by layer, one membership test per key and layer 
+        instead of a walk per key.
+        """
+        found = {}
+        lookup = self.__lookup__
+        imro = self.__imro__
+        if lookup.generation == _lookup_generation[0] and lookup.imro is imro:
+            cached = lookup.items
+            missing = () if lookup.tail else cached
+            for key in keys:
+                f = cached.get(key)
+                if f is not None or key in missing:
+                    found[key] = f
+            keys = [key for key in keys if key not in found]
+        blocked = self.blocked
+        if blocked:
+            sls = self.__imro_slices__
+            local = imro[sls[0]]+imro[sls[1]]
+            found.update(_layers_lookup(local, [key for key in keys if key in blocked]))
+            keys = [key for key in keys if key not in blocked]
+        found.update(_layers_lookup(imro, keys))
+        return found
+
+    def _setitem(self, item, value):
         if isinstance(item, tuple):
             item, = item
             self.locals[item] = value
         else:
-            try:   
-                D, realvalue = self.__gettrueitem__(item)
-            except KeyError:
+            found = self._write_lookup(item)
+            if found is None:
                 if item in self.prototypes:
                     v = self.prototypes[item](value)
                     self.locals[item] = v
                 else:    
                     self.locals[item] = value
             else:    
+                D, realvalue = found
                 if hasattr(realvalue, "__rec_set__"):
                     realvalue.__rec_set__(self, D, item, value)
                 else:
@@ -257,19 +578,77 @@ class BaseRecObject(object):
                         self.locals[item] = value
 
     def __delitem__(self, item):        
-        del self.locals[item]   
+        if _subscriptions[0]:
+            with _ChangeWatch(self, (item,)):
+                del self.locals[item]
+        else:
+            del self.locals[item]   
+
+    def subscribe(self, callback, keys=None):
+        """ call callback(events) when values seen by this object or its children change 
+
+        events is a list of RecChange(key, path, old, new), path is the path of 
+        the object seeing the change relative to this one ("" for itself, 
+        ".det.amp" for a child). 
+        A write on an object notifies the subscribers of the object and of its 
+        parents, so do block and release as they change the values seen. It fans out to the instantiated children which inherit the key, 
+        the children shadowing it in their instance layers are skipped, as well 
+        as the ones blocking it. The events of one update() or propagate() are 
+        coalesced in one call per callback, see also batch_changes. 
+        Old and new are the true values, RecChange.MISSING if the key was not set.
+        `keys` restricts the subscription to a set of keys.
+        Return callback.
+        """
+        _subscribers.setdefault(self, []).append((callback, None if keys is None else frozenset(keys)))
+        _subscriptions[0] = len(_subscribers)
+        return callback
+
+    def unsubscribe(self, callback):
+        """ remove all the subscriptions of callback on this object """
+        subs = [s for s in _subscribers.get(self, ()) if s[0] != callback]
+        if subs:
+            _subscribers[self] = subs
+        else:
+            _subscribers.pop(self, None)
+        _subscriptions[0] = len(_subscribers)
 
     def block(self, *a):
         """ block a list of argument from being taken from parents """
-        self.blocked.update(a)    
+        if _subscriptions[0]:
+            with _ChangeWatch(self, a):
+                self._block(a)
+        else:
+            self._block(a)
+
+    def _block(self, a):
+        if _threadsafe[0]:
+            self.blocked = self.blocked.union(a)
+        else:    
+            self.blocked.update(a)    
+        _lookup_generation[0] += 1
     
     def release(self, *keys):
         """ release a list of arguments if they have been blocked """
-        for k in keys:
-            try:
-                self.blocked.remove(k)
-            except KeyError:
-                pass        
+        if _subscriptions[0]:
+            with _ChangeWatch(self, keys):
+                self._release(keys)
+        else:
+            self._release(keys)
+
+    def _release(self, keys):
+        if _threadsafe[0]:
+            self.blocked = self.blocked.difference(keys)
+        else:    
+            for k in keys:
+                try:
+                    self.blocked.remove(k)
+                except KeyError:
+                    pass        
+        _lookup_generation[0] += 1
+
+    def set_prototype(self, key, func):
+        """ set the function used to convert values set to `key` """
+        self.prototypes[key] = func
         
     def clone(self, **kwargs):
         """ clone the curent RecObject 
@@ -290,44 +669,30 @@ class BaseRecObject(object):
          ## everything comming from instance is removed 
         #__imro__ = self.__imro__[sls[0].start:sls[1].stop]
         
-        imro_i  = ({},)+self.__imro__[sls[0]]
+        imro_i  = (RecDict(),)+self.__imro__[sls[0]]
         imro_cl =       self.__imro__[sls[1]]
         imro_p =        self.__imro__[sls[2]]
 
         new = copy.copy(self)
         new.__recobj__ = {}
-        new.__orecobj__ = {}
         new.__recfunc__ = {}
-        new.__orecfunc__ = {}
+        new.__boundrecfunc__ = {}
+        new.__bridgecache__ = (weakref.ref(new), {})
+        ## the columns belong to the children of self, not to the clone children 
+        getattr(new, "__dict__", {}).pop("__columns__", None)
 
         new.__imro__ = imro_i+imro_cl+pirmo        
         n = len(new.__imro__)
         new.__imro_slices__ = (slice(0,1), slice(1,n), slice(n,None)) 
          
-
-        d  = getattr(self, "__recobj__",  {})
-        od = getattr(self, "__orecobj__", {})
-
-        df  = getattr(self, "__recfunc__",  {})
-        odf = getattr(self, "__orecfunc__", {})
-
-
-        for ids,obj in d.iteritems():                                 
-            new.__orecobj__[ids] = obj._clone(imro_i+imro_p+pirmo)               
-            
-        for ids,obj in od.iteritems():
-            if not ids in new.__orecobj__:                          
-                new.__orecobj__[ids] = obj._clone(imro_i+imro_p+pirmo)                
-
         ###
-        # clone the rec func imro instances 
-        for ids,fmro in df.iteritems():                                             
-            new.__orecfunc__[ids] = ({},)+fmro               
-            
-        for ids,fmro in odf.iteritems():
-            if not ids in new.__orecfunc__:                          
-                new.__orecfunc__[ids] = ({},)+fmro
-
+        # the children and the rec func imro instances are cloned when 
+        # first accessed 
+        cimro = imro_i+imro_p+pirmo
+        new.__orecobj__ = _CloneStore(_rec_sources(self, "__recobj__", "__orecobj__"), 
+                                      lambda obj: obj._clone(cimro))
+        new.__orecfunc__ = _CloneStore(_rec_sources(self, "__recfunc__", "__orecfunc__"), 
+                                       _clone_fmro)
         return new 
 
 
@@ -342,7 +707,7 @@ class BaseRecObject(object):
         """ build and return a dictionary containing all keywords/value pairs found in the hierarchy """
         d = {}
         for obj in self.__imro__[::-1]:
-            d.update(**obj)
+            d.update(_layer_items(obj))
         return d
 
     def update(self, __d__={}, **kwargs):
@@ -354,16 +719,55 @@ class BaseRecObject(object):
         # instead of using .locals.update redefine the function in order to take into account
         # an eventual item with a __rec_set__ method 
         if hasattr(__d__, "keys"):
-            for k in __d__.keys():
-                self[k] = __d__[k]
+            items = ((k,__d__[k]) for k in __d__.keys())
         else:
-            for k,v  in __d__:
-                self[k] = v
-        for k,v in kwargs.iteritems():
-            self[k] = v 
+            items = __d__
+        self._setitems(chain(items, kwargs.iteritems()))
         ## prefered to                            
         ## self.locals.update(__d__, **kwargs)        
 
+    def _setitems(self, items):
+        """ set an iterable of (key, value) as obj[key] = value would do 
+
+        The plain values are written in the local layer with one update, the 
+        pending values are written before any __rec_set__ is called
+        """
+        if _subscriptions[0]:
+            items = list(items)
+            with _ChangeWatch(self, [k[0] if isinstance(k, tuple) else k for k,_ in items]):
+                self._write_items(items)
+        else:
+            self._write_items(items)
+
+    def _write_items(self, items):
+        items = list(items)
+        ## the keys are looked up at once, until a __rec_set__ may change the layers
+        lookups = self._write_lookups([item for item, _ in items if not isinstance(item, tuple)])
+        batch = {}
+        prototypes = self.prototypes
+        for item, value in items:
+            if isinstance(item, tuple):
+                item, = item
+                batch[item] = value
+                continue
+            if lookups is None:
+                found = self._write_lookup(item)
+            else:
+                found = lookups.get(item)
+            if found is not None and hasattr(found[1], "__rec_set__"):
+                D, realvalue = found
+                if batch:
+                    self.locals.update(batch)
+                    batch = {}
+                realvalue.__rec_set__(self, D, item, value)
+                lookups = None
+            elif item in prototypes:
+                batch[item] = prototypes[item](value)
+            else:
+                batch[item] = value
+        if batch:
+            self.locals.update(batch)
+
     def setdefault(self, key, value):
         """D.setdefault(k[,d]) -> D.get(k,d), also set D[k]=d if k not in D"""
         try:
@@ -373,30 +777,63 @@ class BaseRecObject(object):
             return value
 
     def keys(self):
-        return self.alls.keys()
+        return list(self.iterkeys())
 
     def values(self):
-        return self.alls.values()        
+        return list(self.itervalues())
 
     def items(self):
-        return self.alls.items()
+        return list(self.iteritems())
     
     def iteritems(self):     
-        """D.iteritems() -> an iterator over the (key, value) *ALL* items of D"""   
-        for obj in self.__imro__:
-            for k,v in obj.iteritems():
-                yield k,v
+        """D.iteritems() -> an iterator over the (key, value) items of D
+
+        Keys are yielded once with the value of the first layer defining them,
+        blocked keys are not taken from parents. Values are the true values. 
+        """   
+        return _rec_iteritems(self)
+
     def iterkeys(self):
-        """ D.iterkeys() -> an iterator over *ALL* the keys of D"""        
-        for obj in self.__imro__:
-            for k in obj.iterkeys():
-                yield k
+        """ D.iterkeys() -> an iterator over the keys of D"""        
+        for k,_ in _rec_iteritems(self):
+            yield k
 
     def itervalues(self):   
-        """ D.itervalues() -> an iterator over *ALL* the values of D"""     
-        for obj in self.__imro__:
-            for v in obj.itervalues():
-                yield v
+        """ D.itervalues() -> an iterator over the true values of D"""     
+        for _,v in _rec_iteritems(self):
+            yield v
+
+    def viewkeys(self):
+        """ D.viewkeys() -> a lazy set-like object providing a view on D's keys """
+        return RecKeysView(self)
+
+    def viewvalues(self):
+        """ D.viewvalues() -> a lazy object providing a view on D's true values """
+        return RecValuesView(self)
+
+    def viewitems(self):
+        """ D.viewitems() -> a lazy set-like object providing a view on D's items """
+        return RecItemsView(self)
+
+    __iter__ = iterkeys
+
+    def __len__(self):
+        n = 0
+        for _ in _rec_iteritems(self):
+            n += 1
+        return n
+
+    def __contains__(self, item):
+        try:
+            self.__gettrueitem__(item)
+        except KeyError:
+            return False
+        return True
+
+    def __nonzero__(self):
+        ## a RecObject is always True even without keys     
+        return True
+    __bool__ = __nonzero__
 
     __parent__ = None
     def get_parent(self):
@@ -405,6 +842,134 @@ class BaseRecObject(object):
     def __rcopy__(self, obj):
         return copy.copy(self)        
 
+    def __copy__(self):
+        ## shallow copy sharing the attribute values, as copy.copy did before 
+        ## __reduce__ was defined
+        cl = self.__class__
+        new = cl.__new__(cl)
+        new.__dict__.update(self.__dict__)
+        return new
+
+    def __reduce__(self):
+        return (_rec_new, (_class_ref(self.__class__),), self.__getstate__())
+
+    def __getstate__(self):
+        """ pickle state of the object 
+
+        The caches are dropped and the layers owned by the class or by the class 
+        attribute this object has been copied from are replaced by a reference, 
+        rebuilt from the class when unpickled. Layer dictionaries shared by several 
+        objects of the pickled tree are serialized once. 
+        The object is detached from its parent: the layers inherited from the 
+        parent are folded into one layer and the parent is not pickled. 
+        The children stored in the object are pickled with it and attached to 
+        it when unpickled.
+        """
+        return self._rec_state(None)
+
+    def _rec_state(self, container):
+        """ pickle state, `container` is the object whose store holds self or None """
+        cl = self.__class__
+        state = _rec_attrs(self)
+        for name in _PICKLE_DROPPED:
+            state.pop(name, None)
+        for name in ("blocked", "prototypes"):
+            if state.get(name, None) is getattr(cl, name):
+                del state[name]
+
+        parent = self.get_parent()
+        state.pop("__parent__", None)
+        if parent is not container:
+            ## a child pickled on its own, or not stored in its parent
+            state["__parent__"] = None
+        template = None
+        if parent is not None:
+            name = _template_name(parent.__class__, self.__iid__)
+            if name is not None:
+                template = (_class_ref(parent.__class__), name)
+                layers = _class_attribute(parent.__class__, name).__imro__
+        if template is None:
+            layers = cl.__class_imro__
+
+        imro = self.__imro__
+        sls = self.__imro_slices__
+        if container is None:
+            ## fold the inherited layers
+            folded = RecDict()
+            for layer in reversed(imro[sls[1].stop:]):
+                folded.update(_layer_items(layer))
+            imro = imro[:sls[1].stop]+((folded,) if folded else ())
+        k = _find_layers(imro, layers, sls[0].stop)
+        if k < 0:
+            template = False
+            state["__imro__"] = (imro, False, ())
+        else:
+            state["__imro__"] = (imro[:k], template, imro[k+len(layers):])
+        state["__imro_slices__"] = (sls[0].stop, sls[1].stop)
+        state["__iid__"] = self.__iid__ if template is False else None
+
+        for store in ("__recobj__", "__orecobj__"):
+            if store in state:
+                state[store] = [(_template_name(cl, idk), _class_ref(child.__class__), 
+                                 child._rec_state(self)) 
+                                for idk, child in _materialized(state[store]).iteritems()]
+        for store in ("__recfunc__", "__orecfunc__"):
+            if store in state:
+                funcs = []
+                for idk, fmro in _materialized(state[store]).iteritems():
+                    name = _template_name(cl, idk)
+                    if name is not None:
+                        tail = _class_attribute(cl, name).__fmro__
+                        k = _find_layers(fmro, tail, len(fmro)-len(tail))
+                        if k == len(fmro)-len(tail):
+                            funcs.append((name, fmro[:k]))
+                state[store] = funcs
+        return state
+
+    def __setstate__(self, state):
+        cl = self.__class__
+        own, template, extra = state.pop("__imro__")
+        if template is None:
+            layers = cl.__class_imro__
+            iid = id(self)
+        elif template is False:
+            layers = ()
+            iid = state["__iid__"]
+        else:
+            origin = _class_attribute(*template)
+            layers = origin.__imro__
+            iid = origin.__iid__
+        self.__imro__ = own+layers+extra
+        n0, n1 = state.pop("__imro_slices__")
+        self.__imro_slices__ = (slice(0,n0), slice(n0,n1), slice(n1,None))
+        state["__iid__"] = iid
+        self.__parent__ = None
+        self.__lookup__ = _LookupCache(None, None, None, None, -1)
+
+        for store in ("__recobj__", "__orecobj__"):
+            if store in state:
+                d = {}
+                for name, ccl, cstate in state[store]:
+                    if name is None:
+                        continue
+                    parented = "__parent__" not in cstate
+                    child = _rec_new(ccl)
+                    child.__setstate__(cstate)
+                    if parented:
+                        child.__parent__ = weakref.ref(self)
+                    d[_class_attribute(cl, name).__iid__] = child
+                state[store] = d
+        for store in ("__recfunc__", "__orecfunc__"):
+            if store in state:
+                d = {}
+                for name, fown in state[store]:
+                    func = _class_attribute(cl, name)
+                    d[func.__iid__] = fown+func.__fmro__
+                state[store] = d
+        state.pop("__parent__", None)
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
     def __get__(self, obj, cl):
         sid = id(self)
 
@@ -442,7 +1007,7 @@ class BaseRecObject(object):
         #lookup = "__recobj__" if obj_instanced else "__orecobj__"
 
         #d  = obj.__dict__.setdefault(lookup, {})
-        od = obj.__dict__.setdefault("__orecobj__", {})
+        od = _rec_store(obj, "__orecobj__")
 
         #idk = "__recobj_%s__"%sid
         idk = self.__iid__#+getattr(obj, "__ids__" , id(obj))
@@ -458,7 +1023,7 @@ class BaseRecObject(object):
 
 
         if obj_instanced:
-            d  = obj.__dict__.setdefault("__recobj__", {})
+            d  = _rec_store(obj, "__recobj__")
             try:
                 new = d[idk]
             except KeyError:
@@ -468,7 +1033,7 @@ class BaseRecObject(object):
                     new = self.__rcopy__( obj )
                     new.__parent__ = weakref.ref(obj)                     
                     origin = self
-                    imro_i  = ({},)+self.__imro__[self.__imro_slices__[0]]
+                    imro_i  = (RecDict(),)+self.__imro__[self.__imro_slices__[0]]
                     imro_cl =       self.__imro__[self.__imro_slices__[1]]
                     imro_p  =       self.__imro__[self.__imro_slices__[2]]    
 
@@ -494,15 +1059,17 @@ class BaseRecObject(object):
                 n = len(imro_i)
                 n2 = n + len(imro_cl)
                 new.__imro_slices__ = (slice(0,n),slice(n,n2), slice(n2,None))
-                                  
-                d[idk] = new
+                # publish atomically, a concurrent binding may have won the race 
+                new = d.setdefault(idk, new)
+                _limit_copies(obj, d)
+                _index_binding(obj, idk)
         else:
             try:
                 new = od[idk]
             except KeyError:
                 new = self.__rcopy__( obj )
                 new.__parent__ = weakref.ref(obj) 
-                imro_i  = ({},)+self.__imro__[self.__imro_slices__[0]]
+                imro_i  = (RecDict(),)+self.__imro__[self.__imro_slices__[0]]
                 imro_cl =       self.__imro__[self.__imro_slices__[1]]
                 imro_p  =       self.__imro__[self.__imro_slices__[2]]
 
@@ -522,7 +1089,9 @@ class BaseRecObject(object):
                 n2 = n + len(imro_cl)
                 new.__imro_slices__ = (slice(0,n),slice(n,n2), slice(n2,None))
 
-                od[idk] = new
+                new = od.setdefault(idk, new)
+                _limit_copies(obj, od)
+                _index_binding(obj, idk)
 
         return new        
 
@@ -532,7 +1101,31 @@ class BaseRecObject(object):
 
 class RecObject(BaseRecObject):
     def __repr__(self):
-        return "\n".join(_rec_repr(self.__imro__, [object.__repr__(self)], 0, set(self.blocked)))
+        lines = self.iterrepr(REPR_MAX_KEYS, REPR_MAX_LAYERS)
+        return "\n".join(_limit_lines(lines, REPR_MAX_CHARS))
+
+    def iterrepr(self, max_keys=None, max_layers=None):
+        """ iterator on the lines of the object repr 
+
+        The lines are built while iterating, this is the entry point to page 
+        through large objects. The keys of each layer are listed once, blocked 
+        keys are skipped and values are shown with a bounded repr. 
+        max_keys and max_layers limit the number of keys and layers shown.
+        """
+        yield object.__repr__(self)
+        for line in _rec_repr(self.__imro__, self.blocked, max_keys, max_layers):
+            yield line
+
+    def _repr_pretty_(self, p, cycle):
+        """ IPython pretty printer, lines are streamed to the printer """
+        if cycle:
+            p.text(object.__repr__(self))
+            return
+        lines = _limit_lines(self.iterrepr(REPR_MAX_KEYS, REPR_MAX_LAYERS), REPR_MAX_CHARS)
+        for i, line in enumerate(lines):
+            if i:
+                p.break_()
+            p.text(line)
 
     @classmethod    
     def add_class_child(cl, constructor, name, *args, **kwargs):
@@ -550,275 +1143,2687 @@ class RecObject(BaseRecObject):
     def deploy(self):
         return _deploy({}, self, None)
 
+    def iterdeploy(self):
+        """ iterator of the flat (path, value) records of the tree 
+
+        Local keys of the object are yielded as (key, value), keys of children 
+        as (".child.subchild[key]", value). This is the format understood by 
+        propagate, e.g. new.propagate(dict(obj.iterdeploy())) copies the values
+        set in obj to new. Only the instance layers are yielded, not the class 
+        parameters. Keys of children must not contain '.', '[' or ']'.
+        In the path, the keys of children are read back as numbers when they 
+        look like numbers: a string key which would change is quoted, e.g. 
+        ".child['007']" for the key "007" and ".child[7]" for the key 7.
+        Records are yielded while walking the tree, nothing is accumulated.
+        """
+        return _iterdeploy(self, "")
+
+    def select(self, pattern):
+        """ the descendants matching a glob path, as an ordered dict of path -> child 
+
+        The pattern is a '.' separated path of child names, each name can be a 
+        glob pattern, e.g. ".det*.amp[0-3]". "**" matches any number of levels.
+        The children are found from an index of the class children, the class 
+        dictionaries are not scanned at each query. Siblings are listed in the 
+        natural order of their names.
+        """
+        parts = pattern[1:] if pattern.startswith(".") else pattern
+        return OrderedDict(_iterselect(self, "", parts.split(".") if parts else []))
+
+    def find(self, key=None, predicate=None):
+        """ the descendants having `key`, as an ordered dict of path -> child 
+
+        `key` can be a glob pattern matched against the child keys. If 
+        `predicate` is given it is called with the key value, or with the child 
+        if key is None, and the child is selected if it returns True.
+        """
+        return OrderedDict((path, child) for path, child in _iterdescendants(self, "")
+                           if _match_key(child, key, predicate))
+
     def propagate(self,  data, 
                  dreader=lambda x:x, vreader=lambda x:x): 
         data = _unflat(data, dreader, vreader)       
-        for k,v in data.iteritems():
-            if k[:1]==".":
-                sub = getattr(self,k[1:])
-                if hasattr(sub, "propagate"):
-                    sub.propagate(v)
+        with batch_changes():
+            items = []
+            for k,v in data.iteritems():
+                if isinstance(k, basestring) and k[:1]==".":
+                    sub = getattr(self,k[1:])
+                    if hasattr(sub, "propagate"):
+                        sub.propagate(v)
+                else:
+                    items.append((k, v))
+            if items:
+                self._setitems(items)
+
+
+    def bulk_propagate(self, data, dreader=lambda x:x, vreader=lambda x:x):
+        """ same as propagate for large record sets 
+
+        data is a RecPathTrie or anything accepted by RecPathTrie.compile: a 
+        dictionary or an iterable of flat (path, value) records, as yielded by 
+        iterdeploy. Each child is resolved once and its values are written 
+        in one batch.
+        """
+        if not isinstance(data, RecPathTrie):
+            data = RecPathTrie.compile(data, dreader, vreader)
+        with batch_changes():
+            data.apply(self)
+
+    def _indexed_children(self, group):
+        """ the indexed children of `group` created by add_instances or build_rec_class """
+        indexed = getattr(self, "__indexed__", {})
+        if group is None:
+            if len(indexed) != 1:
+                raise ValueError("group must be one of %r"%sorted(indexed))
+            group, = indexed
+        try:
+            names = indexed[group]
+        except KeyError:
+            raise ValueError("%r has no indexed children %r"%(self.__class__.__name__, group))
+        return group, [getattr(self, name) for name in names]
+
+    def columnize(self, group=None, *keys):
+        """ store the `keys` values of the indexed children of `group` in NumPy columns 
+
+        The values of each key become one array, the children read and write 
+        their element through their local layer: child[key] keeps working and 
+        gather/scatter do not loop over the children. 
+        `group` is the lower case name of the children class, e.g. "det" for 
+        det0, det1, ...; it can be None if the object has one group. Requires numpy. 
+        """
+        if numpy is None:
+            raise ImportError("columnize requires numpy")
+        group, children = self._indexed_children(group)
+        columns = getattr(self, "__columns__", {}).get(group)
+        keys = [key for key in keys if columns is None or key not in columns.arrays]
+        ## only the local values are moved in the columns, a value inherited 
+        ## from the parent or the class must stay inherited 
+        for key in keys:
+            missing = [i for i, child in enumerate(children) if not dict.__contains__(child.locals, key)]
+            if missing:
+                raise ValueError("%r is not set locally in the %s children %r"%(key, group, missing))
+
+        if columns is None:
+            columns = _rec_store(self, "__columns__")[group] = RecColumns(len(children))
+        for child_index, child in enumerate(children):
+            _ColumnDict.install(child, columns, child_index)
+
+        for key in keys:
+            values = [dict.pop(child.locals, key) for child in children]
+            columns.arrays[key] = _new_column(values)
+        columns.touch()
+        return columns
+
+    def gather(self, key, group=None):
+        """ the `key` values of the indexed children of `group` 
+
+        A read-only array of the column if `key` is columnized, otherwise the 
+        values are collected in a new array (a list without numpy).
+        """
+        g, children = self._indexed_children(group)
+        columns = getattr(self, "__columns__", {}).get(g)
+        if columns is not None and key in columns.arrays:
+            view = columns.arrays[key].view()
+            view.flags.writeable = False
+            return view
+        values = [child[key] for child in children]
+        return values if numpy is None else numpy.array(values)
+
+    def scatter(self, key, values, group=None):
+        """ set the `key` values of the indexed children of `group`, one per child """
+        g, children = self._indexed_children(group)
+        if len(values) != len(children):
+            raise ValueError("expecting %d values got %d"%(len(children), len(values)))
+        columns = getattr(self, "__columns__", {}).get(g)
+        with batch_changes():
+            if columns is not None and key in columns.arrays:
+                array = columns.arrays[key]
+                _check_column(array, values)
+                watches = [_ChangeWatch(child, (key,)) for child in children] if _subscriptions[0] else []
+                if array.dtype == object:
+                    for i, value in enumerate(values):
+                        array[i] = value
+                else:
+                    array[:] = values
+                columns.touch()
+                for watch in watches:
+                    watch.__enter__()
+                    watch.__exit__(None, None, None)
             else:
-                self[k] = v    
+                for child, value in zip(children, values):
+                    child[key] = value
 
 
+class SlotRecObject(RecObject):
+    """ Compact RecObject for very large hierarchies 
 
-class RecFuncInstance(object):
-    def __init__(self,  recfunc, fmro, parent):
-        self.recfunc = recfunc     
-        self.parent = parent 
-        self.fmro = fmro
-        self.__doc__ = recfunc.__doc__
+    The instance attributes are stored in __slots__, no instance dictionary is 
+    created. The `blocked` set and `prototypes` dictionary are shared with the 
+    class until they are modified by `block`, `release` or `set_prototype`.
+    """
+    __slots__ = ("__imro__", "__imro_slices__", "__nimro_at_init__", "__iid__", 
+                 "__lookup__", "__parent__", 
+                 "__orecobj__", "__recobj__", "__orecfunc__", "__recfunc__", 
+                 "__boundrecfunc__", "__bridgecache__")
 
-    def __call__(self, *args, **kwargs):
-        args, kwargs = self.recfunc.argspec.substitute_args(self, args, kwargs, offset=1)
-        return self.recfunc.fcall(self.parent, *args, **kwargs)
-  
-    def __getitem__(self, item):
-        for d in self.fmro:
+    def __init__(self, __d__={}, **kwargs):
+        self.__parent__ = None
+        self.__lookup__ = _LookupCache(None, None, None, None, -1)
+        RecObject.__init__(self, __d__, **kwargs)
+
+    def _init_containers(self):
+        pass
+
+    def __copy__(self):
+        cl = self.__class__
+        new = cl.__new__(cl)
+        for name, value in _rec_attrs(self).iteritems():
+            setattr(new, name, value)
+        return new
+
+    def _own(self, name, copier):
+        """ return the `name` container, copy it first if shared with the class """
+        c = getattr(self, name)
+        if c is getattr(self.__class__, name):
+            c = copier(c)
+            setattr(self, name, c)
+        return c    
+
+    def block(self, *a):
+        """ block a list of argument from being taken from parents """
+        self._own("blocked", set)
+        RecObject.block(self, *a)
+
+    def release(self, *keys):
+        """ release a list of arguments if they have been blocked """
+        if any(k in self.blocked for k in keys):
+            self._own("blocked", set)
+            RecObject.release(self, *keys)
+
+    def set_prototype(self, key, func):
+        """ set the function used to convert values set to `key` """
+        self._own("prototypes", dict)[key] = func
+
+
+class _CloneStore(dict):
+    """ __orecobj__ or __orecfunc__ store of a clone 
+
+    An entry of the sources (the stores of the cloned object) is cloned by `make` 
+    when it is first looked up, cloning a tree does not walk its children.
+    The sources are read when needed, like the instance layers of the cloned 
+    object the children follow the changes of the cloned children, including 
+    the children instantiated on the cloned object after the clone.
+    """
+    __slots__ = ("sources", "make")
+    def __init__(self, sources, make):
+        dict.__init__(self)
+        self.sources = sources
+        self.make = make
+
+    def __missing__(self, key):
+        for source in self.sources:
             try:
-                return d[item]
+                value = source[key]
             except KeyError:
-                pass    
-        return self.parent[item]
-    
-    def __setitem__(self, item, value):
-        self.fmro[0][item] = value
+                continue
+            return self.setdefault(key, self.make(value))
+        raise KeyError(key)
+
+    def materialize(self):
+        """ clone all the pending entries and return self """
+        for source in self.sources:
+            for key in list(_materialized(source)):
+                if key not in self:
+                    self[key]
+        return self
+
+def _materialized(store):
+    """ the store with all its entries """
+    if isinstance(store, _CloneStore):
+        return store.materialize()
+    return store
+
+def _rec_sources(obj, *names):
+    return tuple(s for s in (getattr(obj, name, None) for name in names) if s is not None)
+
+def _clone_fmro(fmro):
+    return ({},)+fmro
+
+_COPY_ATTRS = frozenset(SlotRecObject.__slots__+("blocked", "prototypes"))
+
+def _rec_store(obj, name):
+    """ return the dictionary stored in the `name` attribute of obj, create it if missing """
+    try:
+        return getattr(obj, name)
+    except AttributeError:
+        with _store_lock:
+            try:
+                return getattr(obj, name)
+            except AttributeError:
+                d = {}
+                setattr(obj, name, d)
+                return d
+
+
+##########################################################
+#
+# Thread safety
+#
+##########################################################
+
+_store_lock = threading.RLock()
+_write_lock = threading.RLock()
+_threadsafe = [False]
+
+_WRITE_METHODS = ("__setitem__", "__delitem__", "_setitems", "update", 
+                  "block", "release", "set_prototype")
+
+class _ReadLock(object):
+    """ lock shared by the read transactions, a writer waits until none runs 
+
+    A transaction starts while holding _write_lock: no transaction starts 
+    during a write and new readers do not starve a waiting writer.
+    """
+    def __init__(self):
+        self.count = 0
+        self.cond = threading.Condition(threading.Lock())
+        self.local = threading.local()
+
+    def acquire(self):
+        depth = getattr(self.local, "depth", 0)
+        if not depth:
+            with _write_lock:
+                with self.cond:
+                    self.count += 1
+        self.local.depth = depth+1
+
+    def release(self):
+        depth = self.local.depth = self.local.depth-1
+        if not depth:
+            with self.cond:
+                self.count -= 1
+                if not self.count:
+                    self.cond.notify_all()
+
+    def check(self):
+        """ raise a RuntimeError if the thread runs a transaction, a write would wait for itself """
+        if getattr(self.local, "depth", 0):
+            raise RuntimeError("cannot write inside a read_transaction")
+
+    def wait(self):
+        """ wait the end of the running transactions, called by a writer holding _write_lock """
+        with self.cond:
+            while self.count:
+                self.cond.wait()
+
+_read_lock = _ReadLock()
+
+def _locked(method):
+    def locked(self, *args, **kwargs):
+        if _read_lock.count:
+            _read_lock.check()
+        with _write_lock:
+            if _read_lock.count:
+                _read_lock.wait()
+            return method(self, *args, **kwargs)
+    locked.__name__ = method.__name__
+    locked.__doc__ = method.__doc__
+    locked.__unlocked__ = method
+    return locked
+
+class read_transaction(object):
+    """ context manager in which the reads see no write in progress 
+
+        with read_transaction():
+            x, y = obj["x"], obj["y"]
+
+    Writers are excluded while the block runs, a block reading several keys 
+    sees the values between two complete writes. Transactions of several 
+    threads run in parallel, they only exclude the writers. The writers are 
+    only excluded in thread-safe mode (see set_threadsafe), writing inside 
+    the block raises a RuntimeError in this mode. Keep the block short, it 
+    blocks the writers of every RecObject.
+    """
+    def __enter__(self):
+        _read_lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        _read_lock.release()
+
+def set_threadsafe(flag=True):
+    """ Switch the thread-safe mode of all RecObjects on or off 
+
+    Reads are lock free in both modes: one lookup is a sequence of dictionary 
+    reads, each atomic, and the lookup caches are validated by the global 
+    generation, which writers bump after their change.
+    Layers are modified in place, they are not published as immutable 
+    snapshots. A single read returns a value which was set, but a thread 
+    reading several keys can see a multi-key update half applied (e.g. the 
+    new x and the old y of update(x=..., y=...)). Reads needing a consistent 
+    view of several keys must be done inside `with read_transaction():`.
+
+    In thread-safe mode:
+      - writers (`__setitem__`, `__delitem__`, `update`, `block`, `release`, 
+        `set_prototype`) are serialized by one re-entrant lock, so generation 
+        bumps are never lost and a multi-key update is applied as a whole 
+        before an other writer starts.
+      - `block` and `release` publish a new `blocked` set instead of modifying 
+        it in place. Readers holding the previous set keep a consistent view, 
+        but the set is no longer shared with the copies of the object.
+      - iteration (keys, items, views, iterdeploy) walks a snapshot of each 
+        layer, taken atomically, and never fails on a concurrent write.
+
+    Writing directly in a layer (e.g. obj.locals[k] = v) bypasses the lock, 
+    as well as writes done while the mode is off.
+    Binding children and RecFunc is race free in both modes: the first copy 
+    published for a parent is the one returned to every thread.
+
+    Return the previous mode.
+    """
+    flag = bool(flag)
+    previous = _threadsafe[0]
+    if flag == previous:
+        return previous
+    for cl in (BaseRecObject, SlotRecObject):
+        for name in _WRITE_METHODS:
+            method = cl.__dict__.get(name)
+            if method is None:
+                continue
+            if flag:
+                setattr(cl, name, _locked(method))
+            else:
+                setattr(cl, name, method.__unlocked__)
+    _threadsafe[0] = flag
+    return previous
+
+
+##########################################################
+#
+# Change notification
+#
+##########################################################
+
+_subscribers = weakref.WeakKeyDictionary()
+## number of subscribed objects, writes are not watched when 0
+_subscriptions = [0]
+_batch = threading.local()
+
+class _Missing(object):
+    def __repr__(self):
+        return "MISSING"
+
+class RecChange(namedtuple("RecChange", "key path old new")):
+    """ change of the value of `key` seen by the object at `path` 
+
+    old or new is RecChange.MISSING if the key was not set
+    """
+    __slots__ = ()
+    MISSING = _Missing()
+
+def _found(obj, key):
+    try:
+        return obj.__gettrueitem__(key)
+    except KeyError:
+        return None
+
+def _found_value(found):
+    return RecChange.MISSING if found is None else found[1]
+
+def _in_instance(obj, key):
+    return any(key in layer for layer in obj.__imro__[obj.__imro_slices__[0]])
+
+def _ancestry(obj):
+    """ list of (ancestor, path of obj relative to it), starting with (obj, "") """
+    ancestors = [(obj, "")]
+    path = ""
+    while True:
+        parent = obj.get_parent() if hasattr(obj, "get_parent") else None
+        if parent is None:
+            return ancestors
+        path = ".%s%s"%(_template_name(parent.__class__, obj.__iid__) or "?", path)
+        ancestors.append((parent, path))
+        obj = parent
+
+def _child_copies(obj):
+    """ the child copies instantiated on obj, the store used is the one chosen by __get__ """
+    sls = getattr(obj, "__imro_slices__", None)
+    if sls is None:
+        return ()
+    name = "__recobj__" if len(obj.__imro__[sls[0]])>1 else "__orecobj__"
+    return (getattr(obj, name, None) or {}).values()
+
+def _watch_records(obj, keys):
+    """ record the values seen for keys by the watched objects of the obj subtree 
+
+    Return a list of (watchers, path, key, object, found), watchers is a list 
+    of (subscribed object, base path, prefix) to build the event path 
+    relative to the subscribed object.
+    """
+    up = [(a, "", path) for a, path in _ancestry(obj) if a in _subscribers]
+    ## objects leading to the subscribed children of obj 
+    on_path = set()
+    for sub in _subscribers.keys():
+        ancestors = _ancestry(sub)
+        for i, (a, _) in enumerate(ancestors):
+            if a is obj:
+                on_path.update(id(b) for b, _ in ancestors[:i])
+                break
+    if not up and not on_path:
+        return []
+
+    records = []
+    todo = [(obj, "", keys, up)]
+    while todo:
+        o, path, okeys, watchers = todo.pop()
+        if o is not obj and o in _subscribers:
+            watchers = watchers+[(o, path, "")]
+        if watchers:
+            records.extend((watchers, path, key, o, _found(o, key)) for key in okeys)
+        for child in _child_copies(o):
+            if not watchers and id(child) not in on_path:
+                continue
+            ckeys = [k for k in okeys if not _in_instance(child, k)]
+            if ckeys:
+                name = _template_name(o.__class__, child.__iid__) or "?"
+                todo.append((child, path+"."+name, ckeys, watchers))
+    return records
+
+
+class _ChangeWatch(object):
+    """ record the values seen in the obj subtree before a write and queue the 
+    change events when the write is done """
+    __slots__ = ("records",)
+    def __init__(self, obj, keys):
+        self.records = _watch_records(obj, keys)
+
+    def __enter__(self):
+        _open_batch()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            for watchers, path, key, o, old in self.records:
+                new = _found(o, key)
+                if old is None and new is None:
+                    continue
+                if old is not None and new is not None and old[0] is new[0] and old[1] is new[1]:
+                    continue
+                for sub, base, prefix in watchers:
+                    event = RecChange(key, prefix+path[len(base):], _found_value(old), _found_value(new))
+                    for callback, ckeys in _subscribers.get(sub, ()):
+                        if ckeys is None or key in ckeys:
+                            _queue_event(callback, event)
+        finally:
+            _close_batch()
+
+
+def _open_batch():
+    depth = getattr(_batch, "depth", 0)
+    if not depth:
+        _batch.pending = OrderedDict()
+    _batch.depth = depth+1
+
+def _close_batch():
+    _batch.depth -= 1
+    if not _batch.depth:
+        pending = _batch.pending
+        _batch.pending = None
+        _dispatch(pending)
+
+def _queue_event(callback, event):
+    """ add event to the current batch, coalesced with a previous change of the same key and path """
+    pending = _batch.pending
+    k = (id(callback), event.path, event.key)
+    try:
+        _, previous = pending[k]
+    except KeyError:
+        pending[k] = callback, event
+    else:
+        pending[k] = callback, event._replace(old=previous.old)
+
+def _dispatch(pending):
+    calls = OrderedDict()
+    for callback, event in pending.itervalues():
+        if event.old is event.new:
+            continue
+        calls.setdefault(id(callback), (callback, []))[1].append(event)
+    error = None
+    for callback, events in calls.itervalues():
+        try:
+            callback(events)
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
+
+
+class batch_changes(object):
+    """ context manager coalescing the change events of all writes done in its block 
+
+        with batch_changes():
+            obj["a"] = 1
+            obj.child["b"] = 2
     
-    def __delitem__(self, item):
-        del self.fmro[0][item]
+    The subscribers are called once when the outermost block exits.
+    """
+    def __enter__(self):
+        _open_batch()
+        return self
 
+    def __exit__(self, *exc):
+        _close_batch()
 
 
-class RecFunc(object):
-    fcall = None
-    __rec_class__ = None
-    _InstanceClass = RecFuncInstance
-    def __init__(self, *args, **params):        
-        f = None
-        if args and isinstance(args[0], int):
-            self.argspec = ArgSpec.from_recargs(*args)         
-        elif args:
-            if len(args)>1:
-                raise ValueError("expecting a int followed with string args or one positional argument only")
-            f = args[0]
-            self.argspec = ArgSpec.from_method(f, **params)                                            
-        else:
-            self.argspec = ArgSpec(0,[],False,False)
+##########################################################
+#
+# Pickle
+#
+##########################################################
+
+_PICKLE_DROPPED = ("__lookup__", "__boundrecfunc__", "__bridgecache__")
+_template_names = weakref.WeakKeyDictionary()
+
+def _rec_new(cl):
+    return cl.__new__(cl)
+
+##
+# The classes made by build_rec_class are not importable, they are pickled as 
+# the pickled arguments of build_rec_class and the class name. The hierarchy is 
+# rebuilt when unpickled, unless it is still registered in _built_classes 
+_built_classes = weakref.WeakValueDictionary()
+
+class _ClassRecipe(object):
+    """ picklable reference to a class made by build_rec_class """
+    __slots__ = ("data", "name")
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+
+    def __reduce__(self):
+        return (_built_class, (self.data, self.name))
+
+def _class_ref(cl):
+    """ cl, or a picklable reference to it if it was made by build_rec_class """
+    recipe = cl.__dict__.get("__rec_recipe__")
+    if recipe is None:
+        return cl
+    return _ClassRecipe(*recipe)
+
+def _built_class(data, name):
+    """ the class `name` of the hierarchy built with the pickled build_rec_class arguments """
+    root = _built_classes.get(data)
+    if root is None:
+        CMname, path, FuncClass, kwargs = pickle.loads(data)
+        root = build_rec_class(CMname, path, FuncClass, **kwargs)
+        _built_classes[data] = root
+    return root if name is None else getattr(root, name)
+
+def _rec_attrs(obj):
+    """ dictionary of the instance attributes of obj, from its __dict__ and __slots__ """
+    attrs = dict(getattr(obj, "__dict__", ()))
+    for sub in obj.__class__.__mro__:
+        for name in sub.__dict__.get("__slots__", ()):
+            try:
+                attrs[name] = getattr(obj, name)
+            except AttributeError:
+                pass
+    return attrs
+
+def _class_attribute(cl, name):
+    """ the `name` attribute of class cl without calling its __get__ """
+    for sub in cl.__mro__:
+        try:
+            value = sub.__dict__[name]
+        except KeyError:
+            continue
+        if isinstance(value, LazyRecChild):
+            value = value.materialize(cl)
+        return value
+    raise AttributeError("%r has no attribute %r"%(cl, name))
+
+def _template_name(cl, iid):
+    """ name of the class attribute of cl with this __iid__ or None 
+
+    The names are indexed once per class and re-indexed on a miss 
+    """
+    try:
+        names = _template_names[cl]
+    except KeyError:
+        names = None
+    else:
+        try:
+            return names[iid]
+        except KeyError:
+            pass
+    names = {}
+    for sub in reversed(cl.__mro__):
+        for name, value in sub.__dict__.items():
+            if isinstance(value, LazyRecChild):
+                value = value.child
+            viid = getattr(value, "__iid__", None)
+            if viid is not None:
+                names[viid] = name
+    _template_names[cl] = names
+    return names.get(iid, None)
+
+def _find_layers(imro, layers, start):
+    """ index of the first occurence of the `layers` sequence in imro, -1 if not found """
+    m = len(layers)
+    if not m:
+        return start
+    for k in range(len(imro)-m+1):
+        if imro[k] is layers[0] and all(a is b for a,b in zip(imro[k:k+m], layers)):
+            return k
+    return -1
+
+
+_NODE_ATTRS = ("__imro__", "__imro_slices__", "__lookup__", "blocked", "prototypes",
+               "__orecobj__", "__recobj__", "__orecfunc__", "__recfunc__", "__boundrecfunc__")
+
+def rec_sizeof(obj):
+    """ Approximate memory in bytes owned by one RecObject node 
+
+    Count the object, its instance dictionary if any, its local layer and the 
+    containers which are not shared with its class. Child objects and 
+    parent layers are not counted.
+    """
+    cl = obj.__class__
+    size = sys.getsizeof(obj)
+    values = []
+    for name in _NODE_ATTRS:
+        try:
+            v = getattr(obj, name)
+        except AttributeError:
+            continue
+        if v is getattr(cl, name, None):
+            continue
+        values.append(v)
+        size += sys.getsizeof(v)
+        if name == "__lookup__":
+            size += sys.getsizeof(v.items)
+
+    ## the instance __dict__ is the only dictionary referred by obj which is 
+    ## not an attribute value. Found through gc so it is not created for slotted objects  
+    for ref in gc.get_referents(obj):
+        if isinstance(ref, dict) and all(ref is not v for v in values):
+            size += sys.getsizeof(ref)
+    size += sys.getsizeof(obj.locals)
+    return size
+
+
+##
+# Eviction of the child copies and fmros stored by a parent in __recobj__, 
+# __orecobj__, __recfunc__ and __orecfunc__. An entry is evicted only if it is 
+# still in the state of a new copy and if nothing outside of the store refers 
+# to it (reference counts), the next access rebuilds an identical copy. 
+# The holders of a copy are not tracked, they are counted with 
+# sys.getrefcount which is exact only on CPython. On other implementations 
+# (e.g. PyPy, where it is not or poorly implemented) nothing is evicted and 
+# maxcopies has no effect.
+_REFCOUNTS = platform.python_implementation() == "CPython"
+_copy_counters = {"evicted":0, "evicted_fmros":0, "sweeps":0}
+
+def _param_refs(obj):
+    return sys.getrefcount(obj)
+
+def _call_refs():
+    obj = object()
+    return _param_refs(obj)
+## references to an object from a caller variable, a call argument and sys.getrefcount
+_CALL_REFS = _call_refs()
+
+def _evictable(obj):
+    """ True if the stored child copy obj can be dropped and rebuilt on next access """
+    if not _REFCOUNTS:
+        return False
+    ## obj is referred by its store and the caller
+    if sys.getrefcount(obj) > 1+_CALL_REFS:
+        return False
+
+    if obj in _subscribers:
+        return False
+    layer = obj.__imro__[0]
+    if layer:
+        return False
+    ## the local layer is also in copies made from obj if it is an origin
+    owners = 1
+    local = obj.__lookup__.local
+    if local and local[0] is layer:
+        owners += 1
+    if sys.getrefcount(layer) > owners+2:
+        return False
+
+    cl = obj.__class__
+    if obj.blocked != cl.blocked or obj.prototypes != cl.prototypes:
+        return False
+    if any(name not in _COPY_ATTRS for name in getattr(obj, "__dict__", ())):
+        return False
+    for name in ("__recfunc__", "__orecfunc__"):
+        if any(fmro[0] for fmro in (getattr(obj, name, None) or {}).itervalues()):
+            return False
+    ## a held bound instance refers to obj weakly, obj must stay alive for it
+    for instance in (getattr(obj, "__boundrecfunc__", None) or {}).itervalues():
+        if sys.getrefcount(instance) > 3:
+            return False
+    for name in ("__recobj__", "__orecobj__"):
+        for child in (getattr(obj, name, None) or {}).itervalues():
+            if not _evictable(child):
+                return False
+    return True
+
+def _sweep_copies(obj):
+    """ evict the unused copies and fmros stored in obj, return the number evicted """
+    if not _REFCOUNTS:
+        return 0
+    _copy_counters["sweeps"] += 1
+    n = 0
+    for name in ("__recobj__", "__orecobj__"):
+        store = getattr(obj, name, None)
+        if not store:
+            continue
+        for key in list(store):
+            child = store.get(key)
+            if child is not None and _evictable(child):
+                del store[key]
+                n += 1
+    _copy_counters["evicted"] += n
+
+    nf = 0
+    bound = getattr(obj, "__boundrecfunc__", None) or {}
+    for name in ("__recfunc__", "__orecfunc__"):
+        store = getattr(obj, name, None)
+        if not store:
+            continue
+        for key in list(store):
+            fmro = store.get(key)
+            if fmro is None or fmro[0]:
+                continue
+            instance = bound.get(key)
+            ## a bound instance referred outside of the store is in use, 
+            ## references: the store, instance and the getrefcount argument
+            if instance is not None and sys.getrefcount(instance) > 3:
+                continue
+            ## the fmro is also in the cached instance, fmro[0] is also in the 
+            ## fmros derived from this one
+            if sys.getrefcount(fmro) > 3+(instance is not None) or sys.getrefcount(fmro[0]) > 2:
+                continue
+            instance = None
+            del store[key]
+            bound.pop(key, None)
+            nf += 1
+    _copy_counters["evicted_fmros"] += nf
+    return n+nf
+
+def _limit_copies(obj, store):
+    """ sweep the stores of obj when `store` grows above obj.maxcopies 
+
+    The sweep is done when the size reaches a power of two so its cost is 
+    amortized when most copies are in use.
+    """
+    limit = getattr(obj, "maxcopies", None)
+    if limit is not None:
+        n = len(store)
+        if n > limit and not n & (n-1):
+            _sweep_copies(obj)
+
+def _iter_stores(obj, seen):
+    """ yield obj and the copies stored in its subtree, once each """
+    todo = [obj]
+    while todo:
+        o = todo.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        yield o
+        for name in ("__recobj__", "__orecobj__"):
+            todo.extend((getattr(o, name, None) or {}).itervalues())
+
+def evict_copies(obj):
+    """ evict the unused child copies and fmros stored in the obj tree 
+
+    A copy is unused if its local layer is empty, its blocked keys and 
+    prototypes are the ones of its class, its own copies are unused and nothing 
+    else than its parent store refers to it. It is rebuilt on next access.
+    The references are counted with sys.getrefcount, nothing is evicted if 
+    the Python implementation is not CPython.
+    Return the number of evicted entries.
+    """
+    return _sweep_tree(obj, set())
+
+def _sweep_tree(obj, seen):
+    ## children are swept first, no reference to them is kept while sweeping obj
+    n = 0
+    for name in ("__recobj__", "__orecobj__"):
+        store = getattr(obj, name, None) or {}
+        for key in list(store):
+            child = store.get(key)
+            if child is not None and id(child) not in seen:
+                seen.add(id(child))
+                n += _sweep_tree(child, seen)
+    child = None
+    return n+_sweep_copies(obj)
+
+def copy_cache_info(obj=None):
+    """ dictionary of the child copy store sizes in the obj tree and of the eviction counters 
+
+    copies and fmros are the number of stored child copies and RecFunc fmros, 
+    counted once if a store is shared. The counters are global.
+    """
+    info = dict(_copy_counters)
+    if obj is not None:
+        copies = fmros = 0
+        stores = set()
+        for o in _iter_stores(obj, set()):
+            for name in ("__recobj__", "__orecobj__", "__recfunc__", "__orecfunc__"):
+                store = getattr(o, name, None)
+                if store and id(store) not in stores:
+                    stores.add(id(store))
+                    if name in ("__recobj__", "__orecobj__"):
+                        copies += len(store)
+                    else:
+                        fmros += len(store)
+        info["copies"] = copies
+        info["fmros"] = fmros
+    return info
+
+
+_timer = getattr(time, "perf_counter", time.time)
+
+class _KeyStats(object):
+    __slots__ = ("reads", "misses", "depths", "rec_get_time")
+    def __init__(self):
+        self.reads = 0
+        self.misses = 0
+        self.depths = {}
+        self.rec_get_time = 0.0
+
+
+def _layer_depth(imro, layer):
+    for i,l in enumerate(imro):
+        if l is layer:
+            return i
+    return -1
+
+
+class LookupProfiler(object):
+    """ Opt-in instrumentation of the RecObject item reads 
+
+    While started, every obj[key] records, per class and key, the number of 
+    reads, the number of misses, the __imro__ depth where the value was found
+    and the time spent in __rec_get__. When stopped the lookups run the normal 
+    code, there is no cost.
+
+        with LookupProfiler() as prof:
+            ...
+        print(prof.format_report())
+    """
+    _active = None
+
+    def __init__(self):
+        self.stats = {}
+        self._getitem = None
+
+    def start(self):
+        if LookupProfiler._active is not None:
+            raise RuntimeError("a LookupProfiler is already started")
+        LookupProfiler._active = self
+        self._getitem = BaseRecObject.__dict__["__getitem__"]
+        profiler = self
+        def __getitem__(self, item):
+            return profiler._profiled_getitem(self, item)
+        __getitem__.__doc__ = self._getitem.__doc__
+        BaseRecObject.__getitem__ = __getitem__
+        return self
+
+    def stop(self):
+        if LookupProfiler._active is self:
+            BaseRecObject.__getitem__ = self._getitem
+            LookupProfiler._active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def clear(self):
+        self.stats.clear()
+
+    def _key_stats(self, obj, item):
+        k = (obj.__class__, item)
+        try:
+            return self.stats[k]
+        except KeyError:
+            return self.stats.setdefault(k, _KeyStats())
+
+    def _profiled_getitem(self, obj, item):
+        truevalue = False    
+        if isinstance(item, tuple):
+            if len(item)>1:
+                raise TypeError("Indice must not be a tuple with len>1")
+            item, = item
+            truevalue = True    
+        stats = self._key_stats(obj, item)
+        stats.reads += 1
+        try:
+            D, value = obj.__gettrueitem__(item)
+        except KeyError:
+            stats.misses += 1
+            raise
+        depth = _layer_depth(obj.__imro__, D)
+        stats.depths[depth] = stats.depths.get(depth, 0)+1
+
+        if truevalue or not hasattr(value, "__rec_get__"):
+            return value
+        t0 = _timer()
+        try:
+            return value.__rec_get__(obj, D, item)
+        finally:
+            stats.rec_get_time += _timer()-t0
+
+    def report(self, sort="reads", limit=None):
+        """ list of dictionaries, one per (class, key), sorted by decreasing `sort` 
+
+        keys of the dictionaries are: class, key, reads, misses, mean_depth, 
+        max_depth, depths (depth->count) and rec_get_time (seconds)
+        """
+        rows = []
+        for (cl, key), st in self.stats.iteritems():
+            found = st.reads-st.misses
+            rows.append({
+                "class": cl.__name__, "key": key, 
+                "reads": st.reads, "misses": st.misses, 
+                "mean_depth": (sum(d*n for d,n in st.depths.iteritems())/found if found else None),
+                "max_depth": max(st.depths) if st.depths else None,
+                "depths": dict(st.depths), 
+                "rec_get_time": st.rec_get_time
+            })
+        rows.sort(key=lambda r:r[sort], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def format_report(self, sort="reads", limit=20):
+        """ report as a text table """
+        lines = ["%-20s %-20s %8s %8s %6s %6s %10s"%("class", "key", "reads", "misses", "depth", "max", "rec_get")]
+        for r in self.report(sort, limit):
+            depth = "-" if r["mean_depth"] is None else "%.1f"%r["mean_depth"]
+            lines.append("%-20s %-20s %8d %8d %6s %6s %9.3fs"%(r["class"][:20], repr(r["key"])[:20], 
+                          r["reads"], r["misses"], depth, "-" if r["max_depth"] is None else r["max_depth"], 
+                          r["rec_get_time"]))
+        return "\n".join(lines)
+
+
+class RecFuncInstance(object):
+    """ a RecFunc bound to its parent object 
+
+    The instance is cached on the parent and refers to it weakly, it does not 
+    keep the parent alive: bind the RecFunc to an object which is referred 
+    elsewhere, `Obj().f()` raises a ReferenceError.
+    """
+    def __init__(self,  recfunc, fmro, parent):
+        self.recfunc = recfunc     
+        self._parent = weakref.ref(parent)
+        self.fmro = fmro
+        self.__doc__ = recfunc.__doc__
+
+    @property
+    def parent(self):
+        parent = self._parent()
+        if parent is None:
+            raise ReferenceError("the object of the bound %r was deleted"%(self.recfunc.fcall,))
+        return parent
+
+    def __call__(self, *args, **kwargs):
+        args, kwargs = self.recfunc.argspec.substitute_args(self, args, kwargs, offset=1)
+        return self.recfunc.fcall(self.parent, *args, **kwargs)
+
+    def resolve(self, args=(), kwargs=None):
+        """ return the (function, args, kwargs) that a call would execute """
+        args, kwargs = self.recfunc.argspec.substitute_args(self, args, dict(kwargs or {}), offset=1)
+        return self.recfunc.fcall, (self.parent,)+args, kwargs
+  
+    def __getitem__(self, item):
+        for d in self.fmro:
+            try:
+                return d[item]
+            except KeyError:
+                pass    
+        return self.parent[item]
+    
+    def __setitem__(self, item, value):
+        self.fmro[0][item] = value
+    
+    def __delitem__(self, item):
+        del self.fmro[0][item]
+
+
+
+def _bound_elsewhere(instance, obj):
+    return instance._parent() is not obj
+
+
+class RecFunc(object):
+    fcall = None
+    __rec_class__ = None
+    _InstanceClass = RecFuncInstance
+    def __init__(self, *args, **params):        
+        f = None
+        if args and isinstance(args[0], int):
+            self.argspec = ArgSpec.from_recargs(*args)         
+        elif args:
+            if len(args)>1:
+                raise ValueError("expecting a int followed with string args or one positional argument only")
+            f = args[0]
+            self.argspec = ArgSpec.from_method(f, **params)                                            
+        else:
+            self.argspec = ArgSpec(0,[],False,False)
                                                                  
         self.set_caller(f)#lambda *a,**k:(a,k) if f is None else f
         self.__fmro__ = ({},)
         self.__iid__ = id(self)
 
-    def __get__(self, obj, cl):
-        sid = id(self)
+    def __get__(self, obj, cl):
+        sid = id(self)
+
+        if obj is None:
+            return self
+            #return RecFuncInstance(self, self.__imro__)        
+
+        idk = self.__iid__
+        ##
+        # the bound instance is cached on obj, it refers to obj weakly so there 
+        # is no reference cycle. The store can be shared with copies of obj 
+        # (copy.copy), an instance is reused only if bound to obj 
+        try:
+            instance = obj.__boundrecfunc__[idk]
+        except (AttributeError, KeyError):
+            pass
+        else:
+            if instance._parent() is obj:
+                return instance    
+
+        if hasattr(obj, "__imro__"):
+            obj_instanced = len(obj.__imro__[obj.__imro_slices__[0]])>1              
+        else:
+            obj_instanced = False    
+        
+        
+        od = _rec_store(obj, "__orecfunc__")
+
+
+        if obj_instanced:
+            d  = _rec_store(obj, "__recfunc__")
+            try:
+                fmro = d[idk]
+            except KeyError:
+                try:
+                    origin = od[idk]
+                except KeyError:
+
+                    fmro = ({},)+self.__fmro__
+                    
+                else:
+                    fmro = ({},)+origin
+
+
+                #if hasattr(obj,"__getitem__"):
+                #    fmro += (obj,)
+
+                fmro = d.setdefault(idk, fmro)
+                _limit_copies(obj, d)
+        else:
+            try:
+                fmro = od[idk]
+            except KeyError:
+                fmro = ({},)+self.__fmro__
+                
+                #if hasattr(obj,"__getitem__"):
+                #    fmro += (obj,)
+                
+                fmro = od.setdefault(idk, fmro)
+                _limit_copies(obj, od)
+
+        instance = self._InstanceClass(self, fmro, obj)
+        bound = _rec_store(obj, "__boundrecfunc__")
+        if any(_bound_elsewhere(other, obj) for other in bound.itervalues()):
+            ## store inherited from a copy, obj needs its own 
+            bound = obj.__boundrecfunc__ = {}
+        bound[idk] = instance
+        return instance
+
+
+    @classmethod
+    def factory(cl, *args, **kwargs):
+        if args:
+            argspec = ArgSpec.from_recargs(*args)
+            self = cl(0)
+            self.argspec = argspec
+            
+            self.__fmro__[0].update(**kwargs)
+            return self.caller 
+        def builder(f):
+            argspec = ArgSpec.from_method(f)
+            self = cl(0)
+            self.argspec = argspec
+            
+            self.__fmro__[0].update(**kwargs)
+            return self.caller(f)
+        return builder 
+    
+    def set_caller(self, fcall):
+        """ set in place the fcall function """
+        self.fcall = fcall
+        # for now just copy the doc, will see after what to
+        # do
+        if getattr(fcall, "__doc__", None):
+            self.__doc__ = fcall.__doc__
+
+    def caller(self, fcall):
+        """ same as set_caller but return the object """
+        self.set_caller(fcall)
+        return self
+
+    def __getitem__(self, item):
+        truevalue = False
+        if isinstance(item, tuple):
+            truevalue = True
+            item, = item
+
+        if truevalue:
+            for d in self.__fmro__:
+                try:
+                    return d[item]
+                except KeyError:
+                    pass    
+        else:        
+            for d in self.__fmro__:
+                try:
+                    v =  d[item]
+                except KeyError:
+                    pass
+                else:
+                    if hasattr(v, "__rec_get__"):
+                        return v.__rec_get__(self, d, item)
+                    return v
+
+        raise KeyError("%r"%item)
+    
+    def __setitem__(self, item, value):
+        truevalue = False
+        if isinstance(item, tuple):
+            truevalue = True
+            item, = item
+
+        if truevalue:
+            self.__fmro__[0][item] = value
+
+        else:                
+            try:
+                v = self[item,]
+            except KeyError:
+                self.__fmro__[0][item] = value
+            else:
+                if hasattr(v, "__rec_set__"):
+                    v.__rec_set__(self, self.__fmro__[0], item, value)    
+                else:
+                    self.__fmro__[0][item] = value
+    
+    def __delitem__(self, item):
+        del self.__fmro__[0][item]    
+
+    def map(self, objects, args=(), kwargs=None, pool="thread", processes=None, chunksize=None):
+        """ call the RecFunc bound to each object of `objects`, return the list of results 
+
+        The arguments are substituted from each object before dispatch, the calls
+        are then executed by `pool`: 
+            "thread"  : a multiprocessing.pool.ThreadPool of `processes` workers
+            "process" : a multiprocessing.Pool, the substituted arguments must be 
+                        picklable. The function is sent as its class and 
+                        attribute name and resolved in the worker
+            None      : serial calls
+            or any object with a map(func, iterable, chunksize) method   
+        Results are in the order of `objects`. If some calls failed a RecMapError 
+        is raised with all the errors and the partial results.
+        """
+        return rec_map(self, objects, args, kwargs, pool, processes, chunksize)
+
+    def __call__(self, *args, **kwargs):       
+        if self.__rec_class__:
+            if not isinstance(args[0], self.__rec_class__):
+                raise ValueError("Expecting an instance of %s got %s"%(self.__rec_class__, type(recobj)))
+            newargs, kwargs = self.argspec.substitute_args(self, args[1:], kwargs, offset=1)
+            return self.fcall(args[0], *newargs, **kwargs)
+        else:
+            args, kwargs = self.argspec.substitute_args(self, args, kwargs)
+            return self.fcall(*args, **kwargs)
+                   
+
+class StaticRecFunc(RecFunc):
+    def __get__(self, obj, cl=None):
+        if obj is None:
+            return obj
+        return RecStaticFuncInstance(self, obj)     
+
+
+
+
+
+class RecStaticFuncInstance(RecFuncInstance):
+    def __call__(self, *args, **kwargs):
+        args, kwargs = self.recfunc.argspec.substitute_args(self, args, kwargs, offset=0)
+        return self.recfunc.fcall(*args, **kwargs)
+
+    def resolve(self, args=(), kwargs=None):
+        """ return the (function, args, kwargs) that a call would execute """
+        args, kwargs = self.recfunc.argspec.substitute_args(self, args, dict(kwargs or {}), offset=0)
+        return self.recfunc.fcall, args, kwargs
+
+
+class StaticRecFunc(RecFunc):
+    _InstanceClass = RecStaticFuncInstance
+
+
+class RecMapError(RuntimeError):
+    """ Raised by RecFunc.map when one or more calls failed 
+
+    `errors` is the list of (index, exception) and `results` the list of results
+    with None for the failed calls.
+    """
+    def __init__(self, errors, results):
+        msg = "; ".join("#%d %r"%(i,e) for i,e in errors[:5])
+        if len(errors)>5:
+            msg += "; ..."
+        RuntimeError.__init__(self, "%d call(s) failed: %s"%(len(errors), msg))
+        self.errors = errors
+        self.results = results
+
+
+def _rec_call(task):
+    """ execute one (function, args, kwargs) task, never raise """
+    f, args, kwargs = task
+    try:
+        return True, f(*args, **kwargs)
+    except Exception as e:
+        return False, e
+
+def _rec_call_pickled(data):
+    """ execute one pickled task in a worker process, return the pickled (ok, result) """
+    try:
+        ref, args, kwargs = pickle.loads(data)
+        if isinstance(ref, tuple):
+            owner, name = ref
+            ref = owner.__dict__[name].fcall
+        output = True, ref(*args, **kwargs)
+    except Exception as e:
+        output = False, e
+    try:
+        return pickle.dumps(output, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        if output[0]:
+            e = pickle.PicklingError("cannot pickle the result: %s"%e)
+        else:
+            e = RuntimeError(repr(output[1]))
+        return pickle.dumps((False, e), pickle.HIGHEST_PROTOCOL)
+
+_recfunc_owners = weakref.WeakKeyDictionary()
+
+def _recfunc_ref(recfunc, cl):
+    """ picklable reference to recfunc.fcall: the function itself or (owner class, attribute name) """
+    try:
+        owners = _recfunc_owners[cl]
+    except KeyError:
+        owners = _recfunc_owners[cl] = {}
+    try:
+        return owners[recfunc.__iid__]
+    except KeyError:
+        pass
+    ref = recfunc.fcall
+    try:
+        pickle.dumps(ref, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        ## e.g. a function defined in a class body 
+        for sub in reversed(cl.__mro__):
+            for name, value in sub.__dict__.items():
+                if value is recfunc:
+                    ref = (_class_ref(sub), name)
+    owners[recfunc.__iid__] = ref
+    return ref
+
+def _rec_pool(pool, processes):
+    """ return (pool, owned) from the pool argument of rec_map """
+    if pool == "thread":
+        from multiprocessing.pool import ThreadPool
+        return ThreadPool(processes), True
+    if pool == "process":
+        from multiprocessing import Pool
+        return Pool(processes), True
+    if isinstance(pool, basestring):
+        raise ValueError("pool must be 'thread', 'process', None or a pool object got %r"%pool)
+    return pool, False
+
+def rec_map(recfunc, objects, args=(), kwargs=None, pool="thread", processes=None, chunksize=None):
+    """ call recfunc bound to each object of objects, see RecFunc.map """
+    tasks = []
+    errors = []
+    indexes = []
+    objects = list(objects)
+    ## a process pool receives the tasks pickled here, with the function 
+    ## referred by its class attribute, pickling errors are errors of the call  
+    pickled = pool == "process"
+    for i,obj in enumerate(objects):
+        try:
+            task = recfunc.__get__(obj, obj.__class__).resolve(args, kwargs)
+            if pickled:
+                f, fargs, fkwargs = task
+                if f is recfunc.fcall:
+                    f = _recfunc_ref(recfunc, obj.__class__)
+                task = pickle.dumps((f, fargs, fkwargs), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            errors.append((i,e))
+        else:
+            tasks.append(task)
+            indexes.append(i)
+
+    if pool is None:
+        outputs = [_rec_call(t) for t in tasks]
+    else:
+        pool, owned = _rec_pool(pool, processes)
+        try:
+            outputs = pool.map(_rec_call_pickled if pickled else _rec_call, tasks, chunksize)
+        finally:
+            if owned:
+                pool.close()
+                pool.join()
+        if pickled:
+            outputs = [pickle.loads(o) for o in outputs]
+
+    results = [None]*len(objects)
+    for i,(ok,r) in zip(indexes, outputs):
+        if ok:
+            results[i] = r
+        else:
+            errors.append((i,r))
+    if errors:
+        errors.sort(key=lambda e:e[0])
+        raise RecMapError(errors, results)
+    return results
+
+
+def _layer_items(layer):
+    """ iterator on the items of a __imro__ layer, empty if the layer is not iterable """
+    if _threadsafe[0] and type(layer) in (dict, RecDict):
+        return iter(list(dict.items(layer)))
+    try:
+        return layer.iteritems()
+    except AttributeError:
+        try:
+            return iter(layer.items())
+        except AttributeError:
+            return iter(())
+
+def _rec_iteritems(obj):
+    """ yield the (key, true value) visible from obj without building a merged dictionary """
+    seen = set()
+    blocked = obj.blocked
+    nlocal = obj.__imro_slices__[1].stop
+    for i,layer in enumerate(obj.__imro__):
+        isparent = i >= nlocal
+        for k,v in _layer_items(layer):
+            if k in seen or (isparent and k in blocked):
+                continue
+            seen.add(k)
+            yield k,v
+
+
+class RecKeysView(KeysView):
+    """ lazy view on the keys of a RecObject 
+
+    A collections Set, it supports &, |, -, ^, isdisjoint and the comparisons 
+    with other sets. 
+    """
+    def __iter__(self):
+        return self._mapping.iterkeys()
+
+    def __repr__(self):
+        return "%s(%r)"%(self.__class__.__name__, list(self))    
+
+class RecValuesView(ValuesView):
+    """ lazy view on the true values of a RecObject """
+    def __iter__(self):
+        return self._mapping.itervalues()
+
+    def __contains__(self, value):
+        for v in self._mapping.itervalues():
+            if v is value or v == value:
+                return True
+        return False
+
+    __repr__ = RecKeysView.__repr__.im_func
+
+class RecItemsView(ItemsView):
+    """ lazy view on the (key, true value) items of a RecObject 
+
+    A collections Set like RecKeysView, the set operations need hashable 
+    values.
+    """
+    def __iter__(self):
+        return self._mapping.iteritems()
+
+    def __contains__(self, item):
+        key, value = item
+        try:
+            v = self._mapping[key,]
+        except KeyError:
+            return False
+        return v is value or v == value
+
+    __repr__ = RecKeysView.__repr__.im_func
+
+
+MAX_STRING_LEN = 60
+## limits of RecObject.__repr__ 
+REPR_MAX_KEYS = 200
+REPR_MAX_LAYERS = 50
+REPR_MAX_CHARS = 20000
+## values bigger than this (nbytes or sys.getsizeof) of a type unknown to 
+## reprlib are shown as <type at id> instead of calling their repr
+REPR_MAX_SIZE = 1024
+
+class _ValueRepr(reprlib.Repr):
+    """ bounded repr of the values, containers are not fully walked, 
+    RecObjects are not expanded and big objects of other types are shown 
+    by type and id, see _cheap_repr """
+    def __init__(self):
+        reprlib.Repr.__init__(self)
+        self.maxstring = MAX_STRING_LEN
+        self.maxother = MAX_STRING_LEN
+        self.maxlevel = 3
+
+    repr_unicode = reprlib.Repr.repr_str
+
+    def repr1(self, x, level):
+        if isinstance(x, BaseRecObject):
+            return object.__repr__(x)
+        if not hasattr(self, "repr_"+type(x).__name__):
+            return self.repr_instance(x, level)
+        return reprlib.Repr.repr1(self, x, level)
+
+    def repr_instance(self, x, level):
+        if _cheap_repr(x):
+            return reprlib.Repr.repr_instance(self, x, level)
+        return "<%s at 0x%x>"%(x.__class__.__name__, id(x))
+
+def _cheap_repr(x):
+    """ True if the repr of x is assumed cheap: scalars, objects of this module 
+    and objects not bigger than REPR_MAX_SIZE """
+    if isinstance(x, (bool, int, long, float, complex, type(None), type)):
+        return True
+    if type(x).__module__ == __name__:
+        return True
+    size = getattr(x, "nbytes", None)
+    if not isinstance(size, (int, long)):
+        try:
+            size = sys.getsizeof(x)
+        except TypeError:
+            return False
+    return size <= REPR_MAX_SIZE
+
+_value_repr = _ValueRepr()
+
+def _short_repr(value):
+    s = _value_repr.repr(value)
+    if len(s)>MAX_STRING_LEN:
+        s = s[:MAX_STRING_LEN-4]+"...."
+    return s
+
+def _rec_repr(mro, keys=(), max_keys=None, max_layers=None):
+    """ iterator on the repr lines of the keys of the mro layers 
+
+    A key is shown once, at its first layer, keys in `keys` are skipped. 
+    The layer level is shown by the number of '-'. 
+    """
+    seen = set(keys)
+    nkeys = 0
+    for level, layer in enumerate(mro):
+        if max_layers is not None and level >= max_layers:
+            yield "... %d more layers"%(len(mro)-level)
+            return
+        idt = "-"*level
+        for key, value in _layer_items(layer):
+            if key in seen:
+                continue
+            seen.add(key)
+            if max_keys is not None and nkeys >= max_keys:
+                yield "... more keys"
+                return
+            nkeys += 1
+            yield "%s%r : %s"%(idt, key, _short_repr(value))
+
+def _limit_lines(lines, max_chars):
+    """ take the lines while their total size is below max_chars """
+    size = 0
+    for line in lines:
+        size += len(line)+1
+        if size > max_chars:
+            yield "...."
+            return
+        yield line
+        
+class _ChildIndex(object):
+    """ names of the RecObject children defined in a class and its bases 
+
+    Built once per class from the class __mro__ dictionaries, then updated 
+    by add_instances and when a lazy child is created. A child bound through 
+    __get__ and unknown to the index, or a child set or deleted on the class 
+    or one of its bases, marks it stale, it is rebuilt on next use.
+    `iids` are the __iid__ of the children already created. The names are 
+    kept in natural order (det2 before det10).
+    """
+    __slots__ = ("names", "iids", "stale")
+    def __init__(self, cl):
+        self.names = OrderedDict()
+        self.iids = set()
+        self.stale = False
+        seen = set()
+        names = []
+        for sub in cl.__mro__:
+            for k,v in sub.__dict__.items():
+                if k in seen:
+                    continue
+                seen.add(k)
+                if isinstance(v, LazyRecChild):
+                    v = v.child
+                elif not isinstance(v, RecObject):
+                    continue
+                names.append(k)
+                if v is not None:
+                    self.iids.add(v.__iid__)
+        self.add(names)
+
+    def add(self, names):
+        """ add names to the index, keeping the natural order """
+        new = [name for name in names if name not in self.names]
+        if new:
+            self.names = OrderedDict.fromkeys(sorted(chain(self.names, new), key=_natural_key))
+
+def _natural_key(name):
+    """ sort key of a child name, the numbers are compared as integers """
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", name)]
+
+
+_child_indexes = weakref.WeakKeyDictionary()
+
+def _child_index(cl):
+    """ the _ChildIndex of class cl """
+    index = _child_indexes.get(cl)
+    if index is None or index.stale:
+        new = _ChildIndex(cl)
+        if index is not None:
+            ## children bound but not defined in the class are not looked for again
+            new.iids.update(index.iids)
+        index = _child_indexes[cl] = new
+    return index
+
+def _index_children(cl, names, child=None):
+    """ add `names` children of class cl to the indexes of cl and its subclasses """
+    for sub, index in list(_child_indexes.items()):
+        if cl in sub.__mro__:
+            index.add(names)
+            if child is not None:
+                index.iids.add(child.__iid__)
+
+def _forget_children(cl):
+    """ mark stale the indexes of cl and its subclasses, e.g. after a child is set on cl """
+    todo = [cl]
+    while todo:
+        sub = todo.pop()
+        index = _child_indexes.get(sub)
+        if index is not None:
+            index.stale = True
+        todo.extend(type.__subclasses__(sub))
+
+def _index_binding(obj, iid):
+    """ called when a child is bound to obj, mark the index stale if the child is unknown """
+    index = _child_indexes.get(obj.__class__)
+    if index is not None and iid not in index.iids:
+        index.iids.add(iid)
+        index.stale = True
+
+def _rec_children(obj):
+    """ yield (name, child) for the RecObject children defined in the obj classes """
+    for k in list(_child_index(obj.__class__).names):
+        child = getattr(obj, k, None)
+        if isinstance(child, RecObject):
+            yield k, child
+
+def _child_class(cl, name):
+    """ the class of the child `name` of class cl, a lazy child is not created if possible """
+    for sub in cl.__mro__:
+        try:
+            value = sub.__dict__[name]
+        except KeyError:
+            continue
+        if isinstance(value, LazyRecChild):
+            if value.child is None and isinstance(value.factory, type):
+                return value.factory
+            value = value.materialize(cl)
+        return value.__class__
+    raise AttributeError("%r has no attribute %r"%(cl, name))
+
+def _iterselect(obj, path, parts):
+    """ yield the (path, child) of obj descendants matching the glob `parts` """
+    if not parts:
+        yield path, obj
+        return
+    part, rest = parts[0], parts[1:]
+    cl = obj.__class__
+    ## names are matched before getattr, children out of the pattern are not bound
+    if part == "**":
+        for record in _iterselect(obj, path, rest):
+            yield record
+        for name in list(_child_index(cl).names):
+            if rest and not _child_index(_child_class(cl, name)).names:
+                ## a leaf cannot match the rest of the pattern
+                continue
+            child = getattr(obj, name, None)
+            if isinstance(child, RecObject):
+                for record in _iterselect(child, path+"."+name, parts):
+                    yield record
+    elif has_magic(part):
+        for name in [name for name in _child_index(cl).names if fnmatch.fnmatchcase(name, part)]:
+            child = getattr(obj, name, None)
+            if isinstance(child, RecObject):
+                for record in _iterselect(child, path+"."+name, rest):
+                    yield record
+    else:
+        if part in _child_index(obj.__class__).names:
+            child = getattr(obj, part, None)
+            if isinstance(child, RecObject):
+                for record in _iterselect(child, path+"."+part, rest):
+                    yield record
+
+def _iterdescendants(obj, path):
+    for name, child in _rec_children(obj):
+        cpath = path+"."+name
+        yield cpath, child
+        for record in _iterdescendants(child, cpath):
+            yield record
+
+def _match_key(obj, key, predicate):
+    if key is None:
+        return predicate is None or predicate(obj)
+    if has_magic(key):
+        keys = (k for k in obj.iterkeys() if isinstance(k, basestring) and fnmatch.fnmatchcase(k, key))
+    else:
+        keys = (key,) if key in obj else ()
+    for k in keys:
+        if predicate is None or predicate(obj[k]):
+            return True
+    return False
+
+def _instance_items(obj):
+    """ yield the (key, value) of the obj instance layers, first found """
+    seen = set()
+    for layer in obj.__imro__[obj.__imro_slices__[0]]:
+        for k,v in _layer_items(layer):
+            if k in seen:
+                continue
+            seen.add(k)    
+            yield k,v
+
+def _iterdeploy(obj, path):
+    if not path:
+        for record in _instance_items(obj):
+            yield record
+    else:
+        for k,v in _instance_items(obj):
+            if k.__class__ is not str or k[:1] not in _PLAIN_KEY_START:
+                k = _path_key(k)
+            yield "%s[%s]"%(path, k), v
+    for name, child in _rec_children(obj):
+        for record in _iterdeploy(child, path+"."+name):
+            yield record
+
+def _deploy(d, obj, parent):
+    ## the children are listed with _rec_children so the lazy ones are included 
+    for k, child in _rec_children(obj):
+        d["."+k] = _deploy({}, child, obj.__class__)
+    if parent:
+        ## the class layers, __imro__ is a slot descriptor on a SlotRecObject class
+        skip = set(id(layer) for layer in parent.__class_imro__)
+        for mro in obj.__imro__[::-1]:
+            if not id(mro) in skip:
+                d.update(_layer_items(mro))  
+    else:            
+        d.update(_layer_items(obj.locals))
+    return d                
+
+
+
+
+
+
+def _rec_copy(ro):
+    new = copy.copy(ro)
+    
+    od = dict(new.__dict__.setdefault("__orecobj__", {}))
+    d  = dict(new.__dict__.setdefault("__recobj__", {}))
+
+    new.__imro__ = (RecDict(),)+ro.__imro__
+    for ids, obj in od.iteritems():
+        d[ids] = _rec_copy(obj)
+    return new    
+
+
+class RecPathTrie(object):
+    """ flat propagate records compiled into a tree of target children 
+
+    `items` is the list of (key, value) to set on the target and `children` a 
+    dictionary of child attribute name -> RecPathTrie. 
+    A compiled trie can be applied to several objects.
+    """
+    __slots__ = ("children", "items")
+    def __init__(self):
+        self.children = {}
+        self.items = []
+
+    @classmethod
+    def compile(cl, data, dreader=lambda x:x, vreader=lambda x:x):
+        """ build a RecPathTrie from a dictionary or an iterable of (path, value) records 
+
+        path are "key" for the target itself, ".a.b[key]" for the key of a child
+        or ".a.b" with a dictionary of records relative to the child as value. 
+        """
+        trie = cl()
+        trie.add_records(data, dreader, vreader)
+        return trie
+
+    def add_records(self, data, dreader=lambda x:x, vreader=lambda x:x):
+        data = dreader(data)
+        if hasattr(data, "keys"):
+            records = ((k, data[k]) for k in data.keys())
+        else:
+            records = data    
+        ## the nodes and parsed keys are reused by the records of a same child 
+        nodes = {}
+        keys = {}
+        for k,v in records:
+            if isinstance(k, basestring) and k[:1]=="." and k[-1:]=="]":
+                names, b, key = k[1:-1].partition("[")
+                if b and not "]" in key:
+                    try:
+                        node = nodes[names]
+                    except KeyError:
+                        nodes[names] = node = self._node(names)
+                    try:
+                        key = keys[key]
+                    except KeyError:
+                        keys[key] = key = _pytonify_key(key)
+                    node.items.append((key, vreader(v)))
+                    continue
+            self.add(k, v, dreader, vreader)
+
+    def _node(self, names):
+        """ the node of the '.' separated child names, created if needed """
+        node = self
+        for name in names.split("."):
+            try:
+                node = node.children[name]
+            except KeyError:
+                node = node.children.setdefault(name, self.__class__())
+        return node
+
+    def add(self, path, value, dreader=lambda x:x, vreader=lambda x:x):
+        """ add one flat record """
+        if not (isinstance(path, basestring) and path[:1]=="."):
+            self.items.append((path, vreader(value)))
+            return
+
+        names, b, key = path[1:].partition("[")
+        node = self._node(names)
+        if not b:
+            node.add_records(value, dreader, vreader)
+            return 
+        key, b, garbage = key.partition("]")
+        if not b or garbage.strip():
+            raise ValueError("path error %r"%path)
+        node.items.append((_pytonify_key(key), vreader(value)))
+
+    def apply(self, obj):
+        """ set the records on obj and its children """
+        if self.items:
+            if hasattr(obj, "_setitems"):
+                obj._setitems(self.items)
+            else:    
+                for k,v in self.items:
+                    obj[k] = v
+        for name, sub in self.children.iteritems():
+            child = getattr(obj, name)
+            if hasattr(child, "__setitem__"):
+                sub.apply(child)
+
+
+##########################################################
+#
+# Binary snapshot 
+#
+# header | string table | node table | item tables | child tables
+#  - string table : (nstrings+1) uint64 offsets followed by the bytes of all strings
+#  - node table   : one fixed size record per node in depth first order 
+#                   (path, name, parent, first child, next sibling, nitems, items offset,
+#                    nchildren, children offset)
+#  - item tables  : for each node nitems fixed size (key, value) entries, 
+#                   a tag byte and 8 bytes of payload for both  
+#  - child tables : for each node its (name, node) children sorted by name 
+##########################################################
+_SNAP_MAGIC = b"RECSNAP1"
+_SNAP_VERSION = 2
+_SNAP_HEADER = struct.Struct("<8sIIIQQQ")
+_SNAP_NODE   = struct.Struct("<IIiiiIQIQ")
+_SNAP_ITEM   = struct.Struct("<BB8s8s")
+_SNAP_CHILD  = struct.Struct("<II")
+_SNAP_OFFSET = struct.Struct("<Q")
+_INT64  = struct.Struct("<q")
+_DOUBLE = struct.Struct("<d")
+_NOPAYLOAD = b"\0"*8
+
+(_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, 
+ _T_STR, _T_UNICODE, _T_PICKLE) = range(8)
+
+def _encode_value(v):
+    """ return (tag, payload, data), data are the bytes of a variable size value or None """
+    if v is None:
+        return _T_NONE, _NOPAYLOAD, None
+    if v is True:
+        return _T_TRUE, _NOPAYLOAD, None
+    if v is False:
+        return _T_FALSE, _NOPAYLOAD, None
+    if isinstance(v, (int, long)) and -2**63 <= v < 2**63:
+        return _T_INT, _INT64.pack(v), None
+    if isinstance(v, float):
+        return _T_FLOAT, _DOUBLE.pack(v), None
+    if isinstance(v, bytes):
+        return _T_STR, None, v
+    if isinstance(v, unicode):
+        return _T_UNICODE, None, v.encode("utf-8")
+    return _T_PICKLE, None, pickle.dumps(v, pickle.HIGHEST_PROTOCOL)
+
+def _decode_value(tag, payload, data):
+    """ inverse of _encode_value """
+    if tag == _T_NONE:
+        return None
+    if tag == _T_TRUE:
+        return True
+    if tag == _T_FALSE:
+        return False
+    if tag == _T_INT:
+        return _INT64.unpack(payload)[0]
+    if tag == _T_FLOAT:
+        return _DOUBLE.unpack(payload)[0]
+    if tag == _T_STR:
+        return data
+    if tag == _T_UNICODE:
+        return data.decode("utf-8")
+    if tag == _T_PICKLE:
+        return pickle.loads(data)
+    raise ValueError("unknown value tag %d"%tag)
+
+
+class _SnapshotWriter(object):
+    """ collect the strings and nodes of a snapshot before writing it """
+    def __init__(self):
+        self.strings = []
+        self.sids = {}
+        self.nodes = []
+
+    def string(self, s):
+        try:
+            return self.sids[s]
+        except KeyError:
+            i = self.sids[s] = len(self.strings)
+            self.strings.append(s)
+            return i
+
+    def encode(self, v):
+        """ return (tag, payload) for a key or a value """
+        tag, payload, data = _encode_value(v)
+        if data is not None:
+            payload = _INT64.pack(self.string(data))
+        return tag, payload
+
+    def add_node(self, obj, path, name, parent):
+        i = len(self.nodes)
+        items = []
+        for k,v in _instance_items(obj):
+            kt, kp = self.encode(k)
+            vt, vp = self.encode(v)
+            items.append(_SNAP_ITEM.pack(kt, vt, kp, vp))
+        children = []
+        node = [self.string(path), self.string(name), parent, -1, -1, items, children]
+        self.nodes.append(node)
+
+        last = None
+        for cname, child in _rec_children(obj):
+            j = self.add_node(child, path+"."+cname, cname, i)
+            children.append((cname, j))
+            if last is None:
+                node[3] = j
+            else:
+                last[4] = j
+            last = self.nodes[j]
+        children.sort()
+        return i
+
+    def write(self, f):
+        offset = _SNAP_HEADER.size
+        strings_offset = offset
+
+        offsets = [0]
+        for st in self.strings:
+            offsets.append(offsets[-1]+len(st))
+        nodes_offset = strings_offset+_SNAP_OFFSET.size*len(offsets)+offsets[-1]
+        items_offset = nodes_offset+_SNAP_NODE.size*len(self.nodes)
+
+        f.write(_SNAP_HEADER.pack(_SNAP_MAGIC, _SNAP_VERSION, len(self.strings), len(self.nodes), 
+                                  strings_offset, nodes_offset, items_offset))
+        for o in offsets:
+            f.write(_SNAP_OFFSET.pack(o))
+        for st in self.strings:
+            f.write(st)
+
+        offset = items_offset
+        children_offset = items_offset+_SNAP_ITEM.size*sum(len(node[5]) for node in self.nodes)
+        for path, name, parent, first, next, items, children in self.nodes:
+            f.write(_SNAP_NODE.pack(path, name, parent, first, next, len(items), offset, 
+                                    len(children), children_offset))
+            offset += _SNAP_ITEM.size*len(items)
+            children_offset += _SNAP_CHILD.size*len(children)
+        for node in self.nodes:
+            for item in node[5]:
+                f.write(item)
+        for node in self.nodes:
+            for cname, j in node[6]:
+                f.write(_SNAP_CHILD.pack(self.sids[cname], j))
+
+
+def save_snapshot(obj, filename):
+    """ write the values of the obj tree in a binary snapshot file 
+
+    As iterdeploy, the instance values of obj and its children are saved, not 
+    the class parameters. None, bool, int, float and strings are encoded 
+    in the file, other values are pickled. 
+    The file is read lazily with RecSnapshot (or load_snapshot).
+    """
+    writer = _SnapshotWriter()
+    writer.add_node(obj, "", "", -1)
+    with open(filename, "wb") as f:
+        writer.write(f)
+
+
+def load_snapshot(filename):
+    """ open a snapshot file written by save_snapshot, see RecSnapshot """
+    return RecSnapshot(filename)
+
+
+class RecSnapshot(object):
+    """ Read-only memory mapped snapshot written by save_snapshot 
+
+    The file is memory mapped, several processes opening the same file 
+    share its pages. Nodes and values are decoded only when accessed:
+        snap = RecSnapshot(filename)
+        snap.root.det0.amp1["gain"]
+        snap.apply(obj) # propagate the saved values to obj 
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _SNAP_HEADER.unpack_from(self._mm, 0)
+        magic, version, self.nstrings, self.nnodes = header[:4]
+        self._strings_offset, self._nodes_offset, self._items_offset = header[4:]
+        if magic != _SNAP_MAGIC:
+            raise ValueError("%r is not a RecObject snapshot"%filename)
+        if version != _SNAP_VERSION:
+            raise ValueError("unsupported snapshot version %d"%version)
+        self._blob_offset = self._strings_offset+_SNAP_OFFSET.size*(self.nstrings+1)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, i):
+        """ return the bytes of the #i string of the string table """
+        o = self._strings_offset+_SNAP_OFFSET.size*i
+        start, = _SNAP_OFFSET.unpack_from(self._mm, o)
+        end,   = _SNAP_OFFSET.unpack_from(self._mm, o+_SNAP_OFFSET.size)
+        return self._mm[self._blob_offset+start:self._blob_offset+end]
+
+    def decode(self, tag, payload):
+        data = None
+        if _T_STR <= tag <= _T_PICKLE:
+            data = self.string(_INT64.unpack(payload)[0])
+        return _decode_value(tag, payload, data)
+
+    def node(self, i):
+        """ return the #i node, 0 is the root """
+        if not 0 <= i < self.nnodes:
+            raise IndexError("snapshot has no node #%d"%i)
+        return SnapshotNode(self, i)
+
+    @property
+    def root(self):
+        return self.node(0)
+
+    def iterdeploy(self):
+        """ iterator of the flat (path, value) records as yielded by RecObject.iterdeploy """
+        for i in range(self.nnodes):
+            node = self.node(i)
+            path = node.path
+            for k,v in node.iteritems():
+                yield ("%s[%s]"%(path, _path_key(k)) if path else k), v
+
+    def deploy(self):
+        """ the saved values as a nested dictionary, see SnapshotNode.deploy """
+        return self.root.deploy()
+
+    def apply(self, obj):
+        """ write the saved values to obj and its children 
+
+        The decoded items of each node are written to the matching child in 
+        one batch, the keys keep their type (e.g. the str "3" and the int 3).
+        """
+        with batch_changes():
+            _apply_node(self.root, obj)
+
+
+def _apply_node(node, obj):
+    items = list(node.iteritems())
+    if items:
+        obj._setitems(items)
+    for name, child in node.children():
+        sub = getattr(obj, name)
+        if hasattr(sub, "_setitems"):
+            _apply_node(child, sub)
+
+
+class SnapshotNode(object):
+    """ lazy read-only mapping on the values of one node of a RecSnapshot 
+
+    Children are accessible as attributes, e.g. node.det0.amp1, they are 
+    found by a binary search in the node child table.
+    """
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+        (self._path, self._name, self.parent_index, self._first, self._next, 
+         self._nitems, self._items, self._nchildren, self._children) = _SNAP_NODE.unpack_from(
+                           snapshot._mm, snapshot._nodes_offset+index*_SNAP_NODE.size)
+        self._offsets = None
+
+    @property
+    def path(self):
+        return self.snapshot.string(self._path)
+
+    @property
+    def name(self):
+        return self.snapshot.string(self._name)
+
+    def _entry(self, i):
+        return _SNAP_ITEM.unpack_from(self.snapshot._mm, self._items+i*_SNAP_ITEM.size)
+
+    def _key_index(self):
+        """ key -> entry number, decoded at first access """
+        if self._offsets is None:
+            decode = self.snapshot.decode
+            self._offsets = {}
+            for i in range(self._nitems):
+                kt, vt, kp, vp = self._entry(i)
+                self._offsets[decode(kt, kp)] = i
+        return self._offsets
+
+    def __getitem__(self, key):
+        kt, vt, kp, vp = self._entry(self._key_index()[key])
+        return self.snapshot.decode(vt, vp)
+
+    def __contains__(self, key):
+        return key in self._key_index()
+
+    def __len__(self):
+        return self._nitems
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def iteritems(self):
+        decode = self.snapshot.decode
+        for i in range(self._nitems):
+            kt, vt, kp, vp = self._entry(i)
+            yield decode(kt, kp), decode(vt, vp)
+
+    def iterkeys(self):
+        for k,_ in self.iteritems():
+            yield k
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def children(self):
+        """ yield the (name, node) children """
+        i = self._first
+        while i >= 0:
+            node = self.snapshot.node(i)
+            yield node.name, node
+            i = node._next
+
+    def child(self, name):
+        """ return the child node `name`, KeyError if not found """
+        snapshot = self.snapshot
+        mm = snapshot._mm
+        lo, hi = 0, self._nchildren
+        while lo < hi:
+            mid = (lo+hi)//2
+            sid, i = _SNAP_CHILD.unpack_from(mm, self._children+mid*_SNAP_CHILD.size)
+            cname = snapshot.string(sid)
+            if cname < name:
+                lo = mid+1
+            elif cname > name:
+                hi = mid
+            else:
+                return snapshot.node(i)
+        raise KeyError(name)
+
+    def __getattr__(self, attr):
+        if attr[:1] == "_":
+            raise AttributeError(attr)
+        try:
+            return self.child(attr)
+        except KeyError:
+            raise AttributeError("snapshot node %r has no child %r"%(self.path, attr))
+
+    def deploy(self):
+        """ the values of the node and its children as a nested dictionary 
+
+        Keys of children are ".name" as in RecObject.deploy, the result can be 
+        given to RecObject.propagate.
+        """
+        d = dict(self.iteritems())
+        for name, node in self.children():
+            d["."+name] = node.deploy()
+        return d
+
+    def __repr__(self):
+        return "<SnapshotNode %r %d items>"%(self.path or ".", self._nitems)
+
+
+##########################################################
+#
+# Shared memory parameters
+#
+# header | key table | key strings | value slots | heap
+#  - key table   : nkeys (tag, offset, length) entries pointing in the key strings 
+#  - value slots : one (tag, 8 bytes payload) slot per key, same encoding than the 
+#                  snapshot items. Variable size values payload is the (offset, length) 
+#                  of their bytes in the heap. 
+#  - the generation in the header is odd while a writer modifies the slots
+##########################################################
+_SHM_MAGIC = b"RECSHM01"
+_SHM_VERSION = 1
+_SHM_HEADER = struct.Struct("<8sIIQQQQQ")
+_SHM_KEY  = struct.Struct("<BQI")
+_SHM_SLOT = struct.Struct("<B8s")
+_SHM_REF  = struct.Struct("<II")
+_SHM_U64  = struct.Struct("<Q")
+_SHM_GEN_OFFSET  = 16
+_SHM_USED_OFFSET = 48
+_T_MISSING = 255
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+class _FileSegment(object):
+    """ shared memory segment on a memory mapped file 
+
+    Used when multiprocessing.shared_memory is not available (python < 3.8), 
+    the name of the segment is the file path. 
+    """
+    def __init__(self, name=None, create=False, size=0):
+        if create:
+            if name is None:
+                fd, name = tempfile.mkstemp(prefix="recshm_", dir=_SHM_DIR)
+            else:
+                fd = os.open(name, os.O_CREAT|os.O_EXCL|os.O_RDWR)
+            os.ftruncate(fd, size)
+        else:
+            fd = os.open(name, os.O_RDWR)
+            size = os.fstat(fd).st_size
+        try:
+            self.buf = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.name = name
+        self.size = size
+
+    def close(self):
+        self.buf.close()
+
+    def unlink(self):
+        os.unlink(self.name)
+
+def _open_segment(name, create=False, size=0):
+    if _shared_memory is not None:
+        return _shared_memory.SharedMemory(name=name, create=create, size=size)
+    return _FileSegment(name, create, size)
+
+
+class SharedParameters(object):
+    """ Parameter layer stored in a shared memory segment 
+
+    The set of keys is fixed at creation, the values can be changed by 
+    publishing updates. Other processes attach the segment by its name and 
+    read the values without copying the whole store:
+
+        shared = SharedParameters.create({"gain":1.0, "name":"det"}, keys=["offset"])
+        # in a worker 
+        shared = SharedParameters(name) # or receive it pickled, only the name is sent
+        det = shared.bind(Detector())   # shared is the parent layer of det 
+        det["gain"]
+        # in the parent 
+        shared.update(gain=2.0, offset=3)
+
+    Values are encoded like in the binary snapshot, str, unicode and any other 
+    objects (pickled) are written in a heap of fixed size. 
+    Writers increment a generation counter around each update, readers retry 
+    a read overlapping an update so one update is seen as a whole. Updates of 
+    several processes must be serialized by the caller.
+
+    A SharedParameters has no __version__: RecObjects with it in their 
+    __imro__ do not cache their lookups, so updates published by an other 
+    process are seen immediately.
+    """
+    def __init__(self, name, _segment=None):
+        if _segment is None:
+            _segment = _open_segment(name)
+        self._segment = _segment
+        self.name = _segment.name
+        self._buf = buf = _segment.buf
+        (magic, version, nkeys, _, self._slots_offset, self._heap_offset, 
+         self._heap_size, _) = _SHM_HEADER.unpack_from(buf, 0)
+        if magic != _SHM_MAGIC:
+            raise ValueError("%r is not a shared parameters segment"%name)
+        if version != _SHM_VERSION:
+            raise ValueError("unsupported shared parameters version %d"%version)
+        keys = []
+        for i in range(nkeys):
+            tag, offset, length = _SHM_KEY.unpack_from(buf, _SHM_HEADER.size+i*_SHM_KEY.size)
+            keys.append(_decode_value(tag, None, bytes(buf[offset:offset+length])))
+        self._keys = tuple(keys)
+        self._index = dict((k,i) for i,k in enumerate(keys))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cl, values=None, keys=(), heap_size=1<<16, name=None):
+        """ create a new segment with the keys of `values` plus `keys` 
+
+        `heap_size` is the number of bytes available for the variable size values 
+        written during the life of the segment. 
+        """
+        values = dict(values or {})
+        keys = list(keys)
+        keys += [k for k in values if k not in keys]
+        table = []
+        for k in keys:
+            tag, _, data = _encode_value(k)
+            if tag not in (_T_STR, _T_UNICODE):
+                raise TypeError("shared parameter keys must be strings got %r"%(k,))
+            table.append((tag, data))
+
+        n = len(table)
+        offset = _SHM_HEADER.size+_SHM_KEY.size*n
+        slots_offset = offset+sum(len(data) for _, data in table)
+        heap_offset = slots_offset+_SHM_SLOT.size*n
+
+        segment = _open_segment(name, True, heap_offset+heap_size)
+        buf = segment.buf
+        _SHM_HEADER.pack_into(buf, 0, _SHM_MAGIC, _SHM_VERSION, n, 0, 
+                              slots_offset, heap_offset, heap_size, 0)
+        for i, (tag, data) in enumerate(table):
+            _SHM_KEY.pack_into(buf, _SHM_HEADER.size+i*_SHM_KEY.size, tag, offset, len(data))
+            buf[offset:offset+len(data)] = data
+            offset += len(data)
+            _SHM_SLOT.pack_into(buf, slots_offset+i*_SHM_SLOT.size, _T_MISSING, _NOPAYLOAD)
+
+        shared = cl(segment.name, segment)
+        try:
+            shared.update(values)
+        except:
+            shared.close()
+            shared.unlink()
+            raise
+        return shared
+
+    def __reduce__(self):
+        return (self.__class__, (self.name,))
+
+    @property
+    def generation(self):
+        """ number of updates published since the creation x 2 """
+        return _SHM_U64.unpack_from(self._buf, _SHM_GEN_OFFSET)[0]
+
+    def _read(self, i):
+        """ return the (tag, payload, data) of the #i slot """
+        buf = self._buf
+        o = self._slots_offset+i*_SHM_SLOT.size
+        while True:
+            g, = _SHM_U64.unpack_from(buf, _SHM_GEN_OFFSET)
+            if g & 1:
+                time.sleep(0)
+                continue
+            tag, payload = _SHM_SLOT.unpack_from(buf, o)
+            data = None
+            if _T_STR <= tag <= _T_PICKLE:
+                start, length = _SHM_REF.unpack(payload)
+                start += self._heap_offset
+                data = bytes(buf[start:start+length])
+            if _SHM_U64.unpack_from(buf, _SHM_GEN_OFFSET)[0] == g:
+                return tag, payload, data
+
+    def _slot(self, key):
+        try:
+            return self._index[key]
+        except KeyError:
+            raise KeyError("%r is not in the shared key table"%(key,))
+
+    def _write(self, entries):
+        """ write the (slot, tag, payload, data) entries in one generation """
+        buf = self._buf
+        with self._lock:
+            used, = _SHM_U64.unpack_from(buf, _SHM_USED_OFFSET)
+            ## place the variable size values before modifying anything
+            placed = []
+            for i, tag, payload, data in entries:
+                start = None
+                if data is not None:
+                    otag, opayload = _SHM_SLOT.unpack_from(buf, self._slots_offset+i*_SHM_SLOT.size)
+                    if _T_STR <= otag <= _T_PICKLE:
+                        ostart, olength = _SHM_REF.unpack(opayload)
+                        if len(data) <= olength:
+                            start = ostart
+                    if start is None:
+                        start = used
+                        used += len(data)
+                    payload = _SHM_REF.pack(start, len(data))
+                placed.append((i, tag, payload, data, start))
+            if used > self._heap_size:
+                raise ValueError("shared parameters heap is full (%d bytes)"%self._heap_size)
+
+            g, = _SHM_U64.unpack_from(buf, _SHM_GEN_OFFSET)
+            _SHM_U64.pack_into(buf, _SHM_GEN_OFFSET, g+1)
+            try:
+                for i, tag, payload, data, start in placed:
+                    if data is not None:
+                        h = self._heap_offset+start
+                        buf[h:h+len(data)] = data
+                    _SHM_SLOT.pack_into(buf, self._slots_offset+i*_SHM_SLOT.size, tag, payload)
+                _SHM_U64.pack_into(buf, _SHM_USED_OFFSET, used)
+            finally:
+                _SHM_U64.pack_into(buf, _SHM_GEN_OFFSET, g+2)
+
+    def update(self, __d__={}, **kwargs):
+        """ publish new values, all of them in one generation """
+        items = dict(__d__, **kwargs)
+        self._write([(self._slot(k),)+_encode_value(v) for k,v in items.iteritems()])
 
-        if obj is None:
-            return self
-            #return RecFuncInstance(self, self.__imro__)        
-        if hasattr(obj, "__imro__"):
-            obj_instanced = len(obj.__imro__[obj.__imro_slices__[0]])>1              
-        else:
-            obj_instanced = False    
-        
-        
-        od = obj.__dict__.setdefault("__orecfunc__", {})
+    def __setitem__(self, key, value):
+        self._write([(self._slot(key),)+_encode_value(value)])
 
-        idk = self.__iid__
+    def __delitem__(self, key):
+        i = self._slot(key)
+        if self._read(i)[0] == _T_MISSING:
+            raise KeyError("%r"%(key,))
+        self._write([(i, _T_MISSING, _NOPAYLOAD, None)])
 
+    def __getitem__(self, key):
+        try:
+            i = self._index[key]
+        except KeyError:
+            raise KeyError("%r"%(key,))
+        tag, payload, data = self._read(i)
+        if tag == _T_MISSING:
+            raise KeyError("%r"%(key,))
+        return _decode_value(tag, payload, data)
 
-        if obj_instanced:
-            d  = obj.__dict__.setdefault("__recfunc__", {})
-            try:
-                fmro = d[idk]
-            except KeyError:
-                try:
-                    origin = od[idk]
-                except KeyError:
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
-                    fmro = ({},)+self.__fmro__
-                    
-                else:
-                    fmro = ({},)+origin.__fmro__
+    def __contains__(self, key):
+        i = self._index.get(key)
+        return i is not None and self._read(i)[0] != _T_MISSING
 
+    def iteritems(self):
+        for i, k in enumerate(self._keys):
+            tag, payload, data = self._read(i)
+            if tag != _T_MISSING:
+                yield k, _decode_value(tag, payload, data)
 
-                #if hasattr(obj,"__getitem__"):
-                #    fmro += (obj,)
+    def iterkeys(self):
+        for k,_ in self.iteritems():
+            yield k
 
-                d[idk] = fmro
-        else:
-            try:
-                fmro = od[idk]
-            except KeyError:
-                fmro = ({},)+self.__fmro__
-                
-                #if hasattr(obj,"__getitem__"):
-                #    fmro += (obj,)
-                
-                od[idk] = fmro
+    def __iter__(self):
+        return self.iterkeys()
 
-        return self._InstanceClass(self, fmro, obj)
+    def __len__(self):
+        return sum(1 for i in range(len(self._keys)) if self._read(i)[0] != _T_MISSING)
 
+    def keys(self):
+        return list(self.iterkeys())
 
-    @classmethod
-    def factory(cl, *args, **kwargs):
-        if args:
-            argspec = ArgSpec.from_recargs(*args)
-            self = cl(0)
-            self.argspec = argspec
-            
-            self.__fmro__[0].update(**kwargs)
-            return self.caller 
-        def builder(f):
-            argspec = ArgSpec.from_method(f)
-            self = cl(0)
-            self.argspec = argspec
-            
-            self.__fmro__[0].update(**kwargs)
-            return self.caller(f)
-        return builder 
-    
-    def set_caller(self, fcall):
-        """ set in place the fcall function """
-        self.fcall = fcall
-        # for now just copy the doc, will see after what to
-        # do
-        if getattr(fcall, "__doc__", None):
-            self.__doc__ = fcall.__doc__
+    def values(self):
+        return [v for _,v in self.iteritems()]
 
-    def caller(self, fcall):
-        """ same as set_caller but return the object """
-        self.set_caller(fcall)
-        return self
+    def items(self):
+        return list(self.iteritems())
 
-    def __getitem__(self, item):
-        truevalue = False
-        if isinstance(item, tuple):
-            truevalue = True
-            item, = item
+    def bind(self, obj):
+        """ return a copy of the RecObject `obj` having this store as parent layer 
 
-        if truevalue:
-            for d in self.__fmro__:
-                try:
-                    return d[item]
-                except KeyError:
-                    pass    
-        else:        
-            for d in self.__fmro__:
-                try:
-                    v =  d[item]
-                except KeyError:
-                    pass
-                else:
-                    if hasattr(v, "__rec_get__"):
-                        return v.__rec_get__(self, d, item)
-                    return v
+        The copy is built as a child copy made by RecObject.__get__ but it is 
+        not cached, each call returns a new copy.
+        """
+        new = obj.__rcopy__(self)
+        new.__parent__ = weakref.ref(self)
+        imro, sls = obj.__imro__, obj.__imro_slices__
+        imro_i  = (RecDict(),)+imro[sls[0]]
+        imro_cl = imro[sls[1]]
+        imro_p  = imro[sls[2]]+(self,)
+        new.__imro__ = imro_i+imro_cl+imro_p
+        n = len(imro_i)
+        n2 = n+len(imro_cl)
+        new.__imro_slices__ = (slice(0,n), slice(n,n2), slice(n2,None))
+        return new
 
-        raise KeyError("%r"%item)
-    
-    def __setitem__(self, item, value):
-        truevalue = False
-        if isinstance(item, tuple):
-            truevalue = True
-            item, = item
+    def close(self):
+        """ detach the segment from this process """
+        self._buf = None
+        self._segment.close()
 
-        if truevalue:
-            self.__fmro__[0][item] = value
+    def unlink(self):
+        """ destroy the segment, to be called once by its creator """
+        self._segment.unlink()
 
-        else:                
-            try:
-                v = self[item,]
-            except KeyError:
-                self.__fmro__[0][item] = value
-            else:
-                if hasattr(v, "__rec_set__"):
-                    v.__rec_set__(self, self.__fmro__[0], item, value)    
-                else:
-                    self.__fmro__[0][item] = value
-    
-    def __delitem__(self, item):
-        del self.__fmro__[0][item]    
+    def __enter__(self):
+        return self
 
-    def __call__(self, *args, **kwargs):       
-        if self.__rec_class__:
-            if not isinstance(args[0], self.__rec_class__):
-                raise ValueError("Expecting an instance of %s got %s"%(self.__rec_class__, type(recobj)))
-            newargs, kwargs = self.argspec.substitute_args(self, args[1:], kwargs, offset=1)
-            return self.fcall(args[0], *newargs, **kwargs)
-        else:
-            args, kwargs = self.argspec.substitute_args(self, args, kwargs)
-            return self.fcall(*args, **kwargs)
-                   
+    def __exit__(self, *exc):
+        self.close()
 
-class StaticRecFunc(RecFunc):
-    def __get__(self, obj, cl=None):
-        if obj is None:
-            return obj
-        return RecStaticFuncInstance(self, obj)     
+    def __repr__(self):
+        return "<SharedParameters %r %d keys>"%(self.name, len(self._keys))
 
 
+##########################################################
+#
+# Columns of indexed children
+#
+##########################################################
 
+class RecColumns(object):
+    """ values of keys shared by `size` indexed siblings, one NumPy array per key """
+    def __init__(self, size):
+        self.size = size
+        self.arrays = {}
+        self.version = 0
 
+    def touch(self):
+        self.version += 1
+        _lookup_generation[0] += 1
 
-class RecStaticFuncInstance(RecFuncInstance):
-    def __call__(self, *args, **kwargs):
-        args, kwargs = self.recfunc.argspec.substitute_args(self, args, kwargs, offset=0)
-        return self.recfunc.fcall(*args, **kwargs)
+    def __repr__(self):
+        return "<RecColumns %d rows %r>"%(self.size, sorted(self.arrays))
+
+
+def _column_accepts(dtype, vdtype):
+    """ True if values of vdtype are stored without loss or change of type in a dtype column 
+
+    The cast must be safe and keep the kind of the values, integers are also 
+    accepted in float and complex columns.
+    """
+    if dtype == object:
+        return True
+    if vdtype.kind != dtype.kind and not (vdtype.kind in "iu" and dtype.kind in "fc"):
+        return False
+    return numpy.can_cast(vdtype, dtype)
+
+def _check_column(array, values):
+    """ raise a ValueError if values cannot be written in the column array """
+    if array.dtype == object:
+        return
+    vdtype = numpy.asarray(values).dtype
+    if not _column_accepts(array.dtype, vdtype):
+        raise ValueError("cannot write %s values in a %s column without changing them"%(vdtype, array.dtype))
+
+def _new_column(values):
+    """ a column array of values, of dtype object if numpy would convert some of them """
+    try:
+        array = numpy.array(values)
+    except ValueError:
+        array = None
+    if array is None or array.ndim != 1 or \
+       not all(_column_accepts(array.dtype, numpy.asarray(v).dtype) for v in values):
+        array = numpy.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            array[i] = value
+    return array
+
+
+class _ColumnDict(RecDict):
+    """ local layer of an indexed child with its values of the RecColumns 
+
+    The keys of the columns are read and written in the column arrays at 
+    `index`, the other keys are stored in the dictionary.
+    """
+    __slots__ = ("columns", "index", "_version")
+    def __init__(self, columns, index, *args, **kwargs):
+        self.columns = columns
+        self.index = index
+        RecDict.__init__(self, *args, **kwargs)
+
+    def _get_version(self):
+        return (self._version, self.columns.version)
+    def _set_version(self, version):
+        self._version = version
+    __version__ = property(_get_version, _set_version)
+
+    def _touch(self):
+        self._version += 1
+        _lookup_generation[0] += 1
 
+    @classmethod
+    def install(cl, child, columns, index):
+        """ replace the local layer of child by a column layer, also in the imro of its copies """
+        old = child.__imro__[0]
+        if isinstance(old, cl) and old.columns is columns:
+            return
+        new = cl(columns, index, old)
+        for o in _iter_stores(child, set()):
+            if any(layer is old for layer in o.__imro__):
+                o.__imro__ = tuple(new if layer is old else layer for layer in o.__imro__)
+
+    def __reduce__(self):
+        return (self.__class__, (self.columns, self.index, dict(self)))
 
-class StaticRecFunc(RecFunc):
-    _InstanceClass = RecStaticFuncInstance
+    def __getitem__(self, item):
+        arrays = self.columns.arrays
+        if item in arrays:
+            return arrays[item].item(self.index)
+        return dict.__getitem__(self, item)
 
+    def get(self, item, default=None):
+        try:
+            return self[item]
+        except KeyError:
+            return default
 
-MAX_STRING_LEN = 60
-def _rec_repr(mro, txts, level, keys=set()):
-    
-    if not mro:
-        return txts
+    def __setitem__(self, item, value):
+        arrays = self.columns.arrays
+        if item in arrays:
+            array = arrays[item]
+            if array.dtype != object:
+                _check_column(array, value)
+            array[self.index] = value
+            self.columns.touch()
+        else:
+            RecDict.__setitem__(self, item, value)
 
-    idt = "-"*level
-    ##
-    # requirement for mro object is that they are mappable
-    # and have __getittem__
-    for key in mro[0].keys():
-        if key in keys:
-            continue
-        value = mro[0][key]
-        keys.add(key)
-        s = repr(value)
-        if len(s)>60:
-            s = s[:56]+"...."
-        txts.append( "%s%r : %s"%(idt,key,s)  )    
-    return _rec_repr(mro[1:], txts, level+1, keys)    
-        
-def _deploy(d, obj, parent):
-    for sub in obj.__class__.__mro__:
-        for k,v in sub.__dict__.iteritems():
-            if isinstance(v, RecObject):
-                d["."+k] = _deploy({},getattr(obj,k), sub)
-    if parent:
-        for mro in obj.__imro__[::-1]:
-            if not mro in parent.__imro__:
-                d.update(**mro)  
-    else:            
-        d.update(obj.locals)
-    return d                
+    def __delitem__(self, item):
+        if item in self.columns.arrays:
+            raise KeyError("%r is a column and cannot be deleted"%(item,))
+        RecDict.__delitem__(self, item)
 
+    def update(self, *args, **kwargs):
+        for k,v in dict(*args, **kwargs).iteritems():
+            self[k] = v
 
+    def __contains__(self, item):
+        return item in self.columns.arrays or dict.__contains__(self, item)
+    has_key = __contains__
 
+    def __len__(self):
+        return len(self.columns.arrays)+dict.__len__(self)
 
+    def iteritems(self):
+        items = dict.items(self)
+        items.extend((k, a.item(self.index)) for k,a in self.columns.arrays.items())
+        return iter(items)
 
+    def items(self):
+        return list(self.iteritems())
 
-def _rec_copy(ro):
-    new = copy.copy(ro)
-    
-    od = dict(new.__dict__.setdefault("__orecobj__", {}))
-    d  = dict(new.__dict__.setdefault("__recobj__", {}))
+    def iterkeys(self):
+        for k,_ in self.iteritems():
+            yield k
+    __iter__ = iterkeys
 
-    new.__imro__ = ({},)+ro.__imro__
-    for ids, obj in od.iteritems():
-        d[ids] = _rec_copy(obj)
-    return new    
+    def keys(self):
+        return list(self.iterkeys())
+
+    def itervalues(self):
+        for _,v in self.iteritems():
+            yield v
+
+    def values(self):
+        return list(self.itervalues())
 
 
 def _unflat(d, dreader, vreader):
@@ -853,6 +3858,8 @@ def _unflat(d, dreader, vreader):
     return od
 
 def _pytonify_key(k):
+    if len(k) > 1 and k[0] == k[-1] == "'":
+        return k[1:-1]
     try:
         return int(k)
     except ValueError:
@@ -861,6 +3868,21 @@ def _pytonify_key(k):
         except ValueError:
             return k                    
 
+## first characters of the keys which cannot be read as a number (inf and nan can) 
+_PLAIN_KEY_START = frozenset("abcdefghjklmopqrstuvwxyzABCDEFGHJKLMOPQRSTUVWXYZ_")
+
+def _path_key(k):
+    """ text of key k in a ".child[key]" record, read back as k by _pytonify_key 
+
+    A string read as a number ("007", "1.5") or quoted is quoted, e.g. '007'.
+    """
+    if isinstance(k, basestring):
+        if k[:1] in _PLAIN_KEY_START:
+            return k
+        if _pytonify_key(k) != k:
+            return "'%s'"%k
+    return k
+
 def _aunflat(d):
     d = copy.deepcopy(d)
     for k,v in d.items():
@@ -932,11 +3954,140 @@ class alias(object):
         return object.__repr__(self)
 
 
+class _RecReader(object):
+    """ proxy of a RecObject recording the items read by an alias function
+
+    reads is a list of (item, found) where found is the result of __gettrueitem__
+    or None if the item was missing. volatile is True if a value read has a 
+    __rec_get__ which is not an alias (e.g. a cycle).
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        self.reads = []
+        self.volatile = False
+
+    def __getitem__(self, item):
+        truevalue = False
+        if isinstance(item, tuple):
+            item, = item
+            truevalue = True
+        try:
+            found = self.obj.__gettrueitem__(item)
+        except KeyError:
+            self.reads.append((item, None))
+            raise
+        self.reads.append((item, found))
+        D, value = found
+        if truevalue or not hasattr(value, "__rec_get__"):
+            return value
+        if not isinstance(value, alias):
+            self.volatile = True
+        return value.__rec_get__(self, D, item)
+
+    def __contains__(self, item):
+        try:
+            self[item,]
+        except KeyError:
+            return False
+        return True
+
+    def __getattr__(self, attr):
+        return getattr(self.obj, attr)
+
+
+def _reads_unchanged(obj, reads):
+    """ True if all the recorded reads still resolve to the same layer and value """
+    for item, found in reads:
+        try:
+            now = obj.__gettrueitem__(item)
+        except KeyError:
+            now = None
+        if now is found:
+            continue
+        if now is None or found is None or now[0] is not found[0] or now[1] is not found[1]:
+            return False
+    return True
+
+
+class memoalias(alias):
+    """ alias memoizing its value per object 
+
+    The items read by the function, o[key], are recorded during evaluation 
+    (including the ones read by nested aliases). The value is recomputed only 
+    when one of these items resolves to another layer or another value. 
+    Values read through attributes or modified in place are not tracked, and 
+    values depending on a cycle are never memoized.
+    """
+    def __init__(self, f, doc=None):
+        alias.__init__(self, f, doc)
+        self.memo = weakref.WeakKeyDictionary()
+
+    def __rec_get__(self, obj, d, key):
+        if isinstance(obj, _RecReader) or not hasattr(obj, "__gettrueitem__"):
+            ## nested in an other alias or not a RecObject
+            return alias.__rec_get__(self, obj, d, key)
+        try:
+            reads, v = self.memo[obj]
+        except KeyError:
+            pass
+        else:
+            if _reads_unchanged(obj, reads):
+                return v
+
+        reader = _RecReader(obj)
+        v = self.f(reader)
+        if hasattr(v, "__rec_get__"):
+            v = v.__rec_get__(reader, d, key)
+        if not reader.volatile:
+            self.memo[obj] = (reader.reads, v)
+        return v
+
+
 ##########################################################
 #
 #
 ##########################################################
 
+class LazyRecChild(object):
+    """ class attribute creating its child RecObject at first access 
+
+    factory(*args, **kwargs) is called once, the LazyRecChild is then replaced 
+    by the child in the class which defines it. Used by add_instances and 
+    build_rec_class for indexed children.
+    """
+    __slots__ = ("name", "factory", "args", "kwargs", "child")
+    def __init__(self, name, factory, args=(), kwargs=None):
+        self.name = name
+        self.factory = factory
+        self.args = args
+        self.kwargs = kwargs
+        self.child = None
+
+    def materialize(self, cl):
+        """ create the child if needed and set it on the class owning this attribute """
+        child = self.child
+        if child is None:
+            with _store_lock:
+                child = self.child
+                if child is None:
+                    child = self.child = self.factory(*self.args, **(self.kwargs or {}))
+                    self.args = self.kwargs = None
+        for sub in cl.__mro__:
+            if sub.__dict__.get(self.name) is self:
+                type.__setattr__(sub, self.name, child)
+                _index_children(sub, (self.name,), child)
+                break
+        return child
+
+    def __get__(self, obj, cl):
+        if cl is None:
+            cl = obj.__class__
+        child = self.materialize(cl)
+        if hasattr(child, "__get__"):
+            return child.__get__(obj, cl)
+        return child
+
+
 def build_getter(tpe,core,value):
     if tpe == 0:
         def getter(self, v):
@@ -966,16 +4117,43 @@ def build_cl_getter(tpe,core,value):
     return classmethod(getter)
 
 
+class RecIterator(object):
+    """ Iterator over indexed children returned by the iter_<name> methods 
+
+    The map method calls a RecFunc on all the remaining children, see RecFunc.map
+    """
+    def __init__(self, getter, values):
+        self.getter = getter
+        self.values = iter(values)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self.getter(next(self.values))
+    __next__ = next
+
+    def map(self, func, args=(), kwargs=None, pool="thread", processes=None, chunksize=None):
+        """ call func on each remaining child and return the list of results
+
+        func is a RecFunc or the name of a RecFunc attribute of the children.
+        """
+        children = list(self)
+        if isinstance(func, basestring):
+            if not children:
+                return []
+            func = getattr(children[0].__class__, func)
+        return rec_map(func, children, args, kwargs, pool, processes, chunksize)
+
+
 def build_iterator(name, values):
     def iterator(self, values=values):
-        for v in values:
-            yield getattr(self, name)(v)
+        return RecIterator(getattr(self, name), values)
     return iterator
 
 def build_cl_iterator(name, values):
     def cl_iterator(cl, values=values):
-        for v in values:
-            yield getattr(cl, name)(v)
+        return RecIterator(getattr(cl, name), values)
     return classmethod(cl_iterator)
 
 def build_bridge_property(bridge_name, value):
@@ -984,39 +4162,95 @@ def build_bridge_property(bridge_name, value):
     return property(bridge_property)
 
 
+def _bridge_store(obj):
+    """ resolved path cache of obj, a store inherited from a copy of obj is not used """
+    try:
+        owner, store = obj.__bridgecache__
+    except AttributeError:
+        pass
+    else:
+        if owner() is obj:
+            return store
+    store = {}
+    obj.__bridgecache__ = (weakref.ref(obj), store)
+    return store
+
+def _bridge_cached(obj, key, walk):
+    """ return the cached result of walk() for obj and key 
+
+    walk returns (result, reads, volatile), reads is a list of (object, keyword, found) 
+    the cache is valid while each keyword is resolved to the same layer and value.
+    """
+    store = _bridge_store(obj)
+    generation = _lookup_generation[0]
+    try:
+        entry = store[key]
+    except KeyError:
+        pass
+    else:
+        if entry[0] == generation:
+            return entry[2]
+        for o, p, found in entry[1]:
+            try:
+                now = o.__gettrueitem__(p)
+            except KeyError:
+                break
+            if now is not found and (now[0] is not found[0] or now[1] is not found[1]):
+                break
+        else:
+            entry[0] = generation
+            return entry[2]
+
+    result, reads, volatile = walk()
+    if not volatile:
+        store[key] = [generation, reads, result]
+    return result
+
+def _bridge_walk(obj, path, spath):
+    """ follow path from obj, return (target, reads, volatile) for _bridge_cached """
+    reads = []
+    volatile = False
+    for p,isfunc in path:
+        if not isfunc:
+            obj = getattr(obj,p)
+            continue
+        try:
+            if hasattr(obj, "__gettrueitem__"):
+                found = obj.__gettrueitem__(p)
+                D, v = found
+                reads.append((obj, p, found))
+                if hasattr(v, "__rec_get__"):
+                    v = v.__rec_get__(obj, D, p)
+                    volatile = True
+            else:
+                v = obj[p]
+                volatile = True
+        except KeyError:
+            raise KeyError("Cannot jump to %r, missing %r default keyword is missing in parent"%(spath,p))  
+        try:                
+            obj = getattr(obj,p)(v)
+        except AttributeError:
+            raise KeyError("Cannot jump to %r, probably that %r default keyword value %r is wrong"%(spath,p,v))        
+    return obj, reads, volatile
+
 def build_bridge_func(path,last):
     spath = ".".join(p for p,_ in path)
     lp, lisfunc = last 
+    path = tuple(path)
+    ##
+    # the target is cached per object, see _bridge_cached
     if lisfunc:
         def bridge_func(self, value):
-            for p,isfunc in path:
-                if not isfunc:
-                    self = getattr(self,p)
-                    continue
-                try:
-                    v = self[p]
-                except KeyError:
-                    raise KeyError("Cannot jump to %r, missing %r default keyword is missing in parent"%(spath,p))  
-                try:                
-                    self = getattr(self,p)(v)
-                except AttributeError:
-                    raise KeyError("Cannot jump to %r, probably that %r default keyword value %r is wrong"%(spath,p,v))        
-            return getattr(self,lp)(value)
+            def walk():
+                target, reads, volatile = _bridge_walk(self, path, spath)
+                return getattr(target,lp)(value), reads, volatile
+            return _bridge_cached(self, (path, lp, value), walk)
     else:
         def bridge_func(self):
-            for p,isfunc in path:
-                if not isfunc:
-                    self = getattr(self,p)
-                    continue
-                try:
-                    v = self[p]
-                except KeyError:
-                    raise KeyError("Cannot jump to %r, missing %r default keyword is missing in parent"%(spath,p))  
-                try:                
-                    self = getattr(self,p)(v)
-                except AttributeError:
-                    raise KeyError("Cannot jump to %r, probably that %r default keyword is wrong"%(spath,p))        
-            return getattr(self,lp)
+            def walk():
+                target, reads, volatile = _bridge_walk(self, path, spath)
+                return getattr(target,lp), reads, volatile
+            return _bridge_cached(self, (path, lp), walk)
     if lisfunc:                                
         return bridge_func
     else:
@@ -1040,6 +4274,11 @@ def build_path_property(path, fname, value):
 
 
 def build_rec_class(CMname, path, FuncClass=None, **kwargs):
+    try:
+        data = pickle.dumps((CMname, path, FuncClass, kwargs), pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        ## the classes cannot be pickled 
+        data = None
 
     definitions = []
     path = [(CMname, [])]+path
@@ -1105,9 +4344,10 @@ def build_rec_class(CMname, path, FuncClass=None, **kwargs):
 
                 attrs["iter_%s"%lastkname]  = build_iterator(lastkname, lastvalues)
                 attrs["_iter_%s"%lastkname] = build_cl_iterator("_"+lastkname, lastvalues)
+                attrs["__indexed__"] = {lastkname:list(lastchildattrs)}
 
                 for v,attr in zip(lastvalues,lastchildattrs):
-                    attrs[attr] = lastCl({lastkname:v})                    
+                    attrs[attr] = LazyRecChild(attr, lastCl, ({lastkname:v},))
             else:
                 attrs[lastkname] = lastCl() 
 
@@ -1137,23 +4377,29 @@ def build_rec_class(CMname, path, FuncClass=None, **kwargs):
         lastchildattrs = childattrs
         lasttpe = tpe
         
-    
+    if data is not None:
+        _built_classes[data] = lastCl
+        for Cname, cl in clRecords:
+            type.__setattr__(cl, "__rec_recipe__", (data, None if cl is lastCl else Cname))
 
     return lastCl  
 
 
+def _jump_walk(obj, path, fname, value):
+    for p in path:
+        obj = getattr(obj, p)
+    return getattr(obj,fname)(value), (), False
+
 def build_jump_func(path,fname):
+    path = tuple(path)
     def jump_func(self, v):
-        for p in path:
-            self = getattr(self, p)
-        return getattr(self,fname)(v)
+        return _bridge_cached(self, (path, fname, v), lambda: _jump_walk(self, path, fname, v))
     return jump_func  
 
 def build_jump_property(path,fname, value):
+    path = tuple(path)
     def jump_property(self):
-        for p in path:
-            self = getattr(self, p)
-        return getattr(self,fname)(value)
+        return _bridge_cached(self, (path, fname, value), lambda: _jump_walk(self, path, fname, value))
     return property(jump_property)
 
 
@@ -1224,7 +4470,7 @@ def add_instances(cl, name, Sub, values):
         
         setattr(cl, "iter_"+corename,  build_iterator(corename, idvalues))
         
-        setattr(cl, "_iter_"+corename,  build_cl_iterator(corename, idvalues))
+        setattr(cl, "_iter_"+corename,  build_cl_iterator("_"+corename, idvalues))
         
         ###
         # build the subobjects                
@@ -1237,8 +4483,12 @@ def add_instances(cl, name, Sub, values):
         
         
         for attr,v in zip(attrs, idvalues):
-            o = Sub({corename:v}, **values[v])
-            setattr(cl, attr, o)
+            setattr(cl, attr, LazyRecChild(attr, Sub, ({corename:v},), values[v]))
+
+        indexed = dict(getattr(cl, "__indexed__", {}))
+        indexed[corename] = attrs
+        setattr(cl, "__indexed__", indexed)
+        _index_children(cl, attrs)
         
         record = (name, corename, list(zip(attrs, idvalues)), [])
         
@@ -0,0 +1,55 @@
+""" bridge functions of build_rec_class and their cached targets """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+Top = rec.build_rec_class("Top", [("Det", [0, 1, 2]), ("Amp", [0, 1]), ("Ch", [0, 1, 2])])
+
+
+class TestBridge(unittest.TestCase):
+    def setUp(self):
+        self.top = Top(det=1)
+
+    def test_bridge(self):
+        top = self.top
+        self.assertIs(top.amp1, top.det1.amp1)
+        self.assertIs(top.amp(0), top.det1.amp0)
+        top.det1["amp"] = 0
+        self.assertIs(top.ch2, top.det1.amp0.ch2)
+
+    def test_missing_keyword(self):
+        with self.assertRaises(KeyError):
+            self.top.ch1
+
+    def test_instance_change(self):
+        top = self.top
+        self.assertIs(top.amp1, top.det1.amp1)
+        top["det"] = 2
+        self.assertIs(top.amp1, top.det2.amp1)
+
+    def test_class_change(self):
+        top = self.top
+        try:
+            Top.Det.parameters["amp"] = 0
+            self.assertIs(top.ch1, top.det1.amp0.ch1)
+            Top.Det.parameters["amp"] = 1
+            self.assertIs(top.ch1, top.det1.amp1.ch1)
+        finally:
+            del Top.Det.parameters["amp"]
+
+    def test_alias_not_cached(self):
+        top = self.top
+        amp = []
+        top.det1["amp"] = rec.alias(lambda o: amp[-1])
+        amp.append(0)
+        self.assertIs(top.ch1, top.det1.amp0.ch1)
+        amp.append(1)
+        self.assertIs(top.ch1, top.det1.amp1.ch1)
+
+
+if __name__ == "__main__":
+    unittest.main()
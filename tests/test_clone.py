@@ -0,0 +1,93 @@
+""" lazy clones and the changes of the cloned object """
+import os
+import sys
+import pickle
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    parameters = {"g":1}
+    @rec.RecFunc
+    def f(self, g):
+        return g
+
+class Det(rec.RecObject):
+    amp = Amp()
+    pre = Amp()
+
+class Top(rec.RecObject):
+    det = Det()
+
+
+class TestClone(unittest.TestCase):
+    def setUp(self):
+        self.top = Top(x=1)
+        self.top.det["y"] = 2
+        self.top.det.amp["z"] = 3
+        self.clone = self.top.clone(w=5)
+
+    def test_lazy(self):
+        self.assertEqual(len(self.clone.__orecobj__), 0)
+        self.assertEqual(self.clone.det.amp["z"], 3)
+        self.assertEqual(len(self.clone.__orecobj__), 1)
+        self.assertIsNot(self.clone.det, self.top.det)
+
+    def test_values(self):
+        clone = self.clone
+        self.assertEqual((clone["w"], clone["x"]), (5, 1))
+        self.assertEqual(clone.det["y"], 2)
+        self.assertEqual(clone.det.amp["z"], 3)
+        self.assertEqual(clone.det.amp.f(), 1)
+
+    def test_write_to_source_before_access(self):
+        self.top.det["y"] = 20
+        self.top.det.amp["z"] = 30
+        self.assertEqual(self.clone.det["y"], 20)
+        self.assertEqual(self.clone.det.amp["z"], 30)
+
+    def test_write_to_source_after_access(self):
+        clone = self.clone
+        self.assertEqual(clone.det.amp["z"], 3)
+        self.top.det.amp["z"] = 30
+        self.top["x"] = 10
+        self.assertEqual(clone.det.amp["z"], 30)
+        self.assertEqual(clone["x"], 10)
+        self.assertEqual(clone.det.amp["x"], 10)
+
+    def test_recfunc_write_to_clone(self):
+        clone = self.clone
+        self.top.det.amp.f["g"] = 9
+        self.assertEqual(clone.det.amp.f(), 9)
+        clone.det.amp.f["g"] = 7
+        self.assertEqual(clone.det.amp.f(), 7)
+        self.assertEqual(self.top.det.amp.f(), 9)
+
+    def test_child_instantiated_after_clone(self):
+        self.top.det.pre["z"] = 4
+        self.assertEqual(self.clone.det.pre["z"], 4)
+
+    def test_write_to_clone(self):
+        clone = self.clone
+        clone.det.amp["z"] = 4
+        clone["x"] = 2
+        self.assertEqual(self.top.det.amp["z"], 3)
+        self.assertEqual(self.top["x"], 1)
+
+    def test_clone_of_clone(self):
+        self.clone.det.amp["z"] = 4
+        clone = self.clone.clone()
+        self.assertEqual(clone.det.amp["z"], 4)
+        self.clone.det.amp["z"] = 5
+        self.assertEqual(clone.det.amp["z"], 5)
+
+    def test_pickle(self):
+        clone = pickle.loads(pickle.dumps(self.clone, 2))
+        self.assertEqual(clone.det.amp["z"], 3)
+        self.assertEqual(clone["w"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+""" columns of indexed children """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    parameters = {"gain":1}
+
+class Detector(rec.RecObject):
+    pass
+rec.add_instances(Detector, "Amp", Amp, [0, 1, 2])
+
+
+def detector(**values):
+    det = Detector()
+    for key, column in values.items():
+        det.scatter(key, column)
+    return det
+
+
+@unittest.skipIf(rec.numpy is None, "numpy is not installed")
+class TestColumns(unittest.TestCase):
+    def test_values(self):
+        det = detector(v=[1.5, 2.5, 3.5], n=[1, 2, 3])
+        det.columnize("amp", "v")
+        self.assertEqual(det.amp1["v"], 2.5)
+        det.amp1["v"] = 4.5
+        self.assertEqual(list(det.gather("v")), [1.5, 4.5, 3.5])
+        det.scatter("v", [0.5, 0.5, 0.5])
+        self.assertEqual((det.amp2["v"], det.amp2["n"]), (0.5, 3))
+
+    def test_inherited_keys_are_refused(self):
+        det = detector(v=[1, 2, 3])
+        self.assertRaises(ValueError, det.columnize, "amp", "gain")
+        det["x"] = 1
+        self.assertRaises(ValueError, det.columnize, "amp", "v", "x")
+        self.assertIsNone(getattr(det, "__columns__", None))
+        det.amp1["w"] = 0
+        self.assertRaises(ValueError, det.columnize, "amp", "w")
+
+    def test_inherited_keys_are_not_pinned(self):
+        det = detector(v=[1, 2, 3])
+        det["x"] = 1
+        det.columnize("amp", "v")
+        det["x"] = 2
+        Amp.parameters["gain"] = 5
+        try:
+            self.assertEqual((det.amp0["x"], det.amp0["gain"]), (2, 5))
+        finally:
+            Amp.parameters["gain"] = 1
+
+    def test_writes_keep_the_values(self):
+        det = detector(n=[1, 2, 3], v=[1.5, 2.5, 3.5])
+        det.columnize("amp", "n", "v")
+        with self.assertRaises(ValueError):
+            det.amp0["n"] = 7.9
+        self.assertRaises(ValueError, det.scatter, "n", [1.5, 2, 3])
+        with self.assertRaises(ValueError):
+            det.amp0["v"] = "a"
+        self.assertEqual((det.amp0["n"], list(det.gather("n"))), (1, [1, 2, 3]))
+        det.amp0["v"] = 2
+        det.amp0["n"] = 8
+        self.assertEqual((det.amp0["v"], det.amp0["n"]), (2.0, 8))
+
+    def test_mixed_values(self):
+        det = detector(m=[1, "a", 2.5], b=[True, 2, 3])
+        det.columnize("amp", "m", "b")
+        self.assertEqual([det.amp1["m"], det.amp2["m"], det.amp0["b"]], ["a", 2.5, True])
+        self.assertIs(det.amp0["b"], True)
+        det.amp0["m"] = (1, 2)
+        self.assertEqual(det.amp0["m"], (1, 2))
+
+    def test_alls_and_deploy(self):
+        det = detector(v=[1, 2, 3])
+        deployed = det.deploy()
+        det.columnize("amp", "v")
+        self.assertEqual(det.amp1.alls, {"gain":1, "v":2})
+        self.assertEqual(det.deploy(), deployed)
+        self.assertEqual(dict(det.amp0.locals.items()), {"v":1})
+
+
+class TestWithoutNumpy(unittest.TestCase):
+    def setUp(self):
+        self.numpy, rec.numpy = rec.numpy, None
+
+    def tearDown(self):
+        rec.numpy = self.numpy
+
+    def test_gather_scatter(self):
+        det = Detector()
+        self.assertEqual(det.gather("gain"), [1, 1, 1])
+        det.scatter("gain", [1, 2, 3])
+        self.assertEqual(det.amp2["gain"], 3)
+        self.assertRaises(ValueError, det.scatter, "gain", [1])
+        self.assertRaises(ImportError, det.columnize, "amp", "gain")
+
+
+if __name__ == "__main__":
+    unittest.main()
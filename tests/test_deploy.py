@@ -0,0 +1,105 @@
+""" deploy, iterdeploy and propagate """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class C(rec.RecObject):
+    parameters = {"top":1}
+    class D(rec.RecObject):
+        parameters = {"g":2}
+    class E(rec.RecObject):
+        pass
+    e = E()
+rec.add_instances(C, "D", C.D, [0, 1, 2])
+
+
+class TestDeploy(unittest.TestCase):
+    ## expected values are the ones of deploy before the children were created lazily
+    EXPECTED = {".d0":{"x":1, "g":2}, ".d1":{"y":3, "x":1, "g":2}, ".d2":{"x":1, "g":2}, 
+                ".e":{"x":1, "z":4}, "x":1}
+
+    def test_lazy_children_are_deployed(self):
+        c = C(x=1)
+        c.d1["y"] = 3
+        c.e["z"] = 4
+        self.assertEqual(c.deploy(), self.EXPECTED)
+        ## same result once every child is created
+        for d in c.iter_d():
+            pass
+        self.assertEqual(c.deploy(), self.EXPECTED)
+
+    def test_fresh_class(self):
+        class F(rec.RecObject):
+            pass
+        rec.add_instances(F, "D", C.D, [0, 1])
+        self.assertEqual(F().deploy(), {".d0":{"g":2}, ".d1":{"g":2}})
+
+    def test_build_rec_class(self):
+        T = rec.build_rec_class("Top", [("Det", [0, 1]), ("Amp", [0, 1])])
+        amps = {".amp0":{}, ".amp1":{}}
+        self.assertEqual(T().deploy(), {".det0":amps, ".det1":amps})
+
+    def test_iterdeploy_propagate(self):
+        c = C(x=1)
+        c.d2["y"] = 5
+        records = dict(c.iterdeploy())
+        self.assertEqual(records, {"x":1, ".d2[y]":5})
+        new = C()
+        new.propagate(records)
+        self.assertEqual(new.d2["y"], 5)
+        new = C()
+        new.bulk_propagate(records)
+        self.assertEqual(dict(new.iterdeploy()), records)
+
+    def test_key_types(self):
+        keys = {"007":1, "1e3":2, "3":3, 3:4, "-2":5, "'q'":6, "nan":7, "inf":8, "key":9, "":10}
+        c = C()
+        c.e.update(keys)
+        records = dict(c.iterdeploy())
+        self.assertEqual(records[".e['007']"], 1)
+        self.assertEqual(records[".e[3]"], 4)
+        self.assertEqual(records[".e[key]"], 9)
+        for method in ("propagate", "bulk_propagate"):
+            new = C()
+            getattr(new, method)(records)
+            self.assertEqual(dict(new.e.locals), keys)
+        ## records written by hand are read as before
+        new = C()
+        new.propagate({".e[1]":1, ".e[x]":2})
+        self.assertEqual(dict(new.e.locals), {1:1, "x":2})
+
+
+class S(rec.SlotRecObject):
+    parameters = {"top":1}
+    class D(rec.SlotRecObject):
+        parameters = {"g":2}
+    d = D()
+rec.add_instances(S, "E", S.D, [0, 1])
+
+
+class TestSlotDeploy(unittest.TestCase):
+    def test_deploy(self):
+        s = S(x=1)
+        s.d["y"] = 3
+        self.assertEqual(s.deploy(), {".d":{"x":1, "y":3, "g":2}, ".e0":{"x":1, "g":2}, 
+                                      ".e1":{"x":1, "g":2}, "x":1})
+
+    def test_iterdeploy_propagate(self):
+        s = S(x=1)
+        s.e1["y"] = 5
+        records = dict(s.iterdeploy())
+        self.assertEqual(records, {"x":1, ".e1[y]":5})
+        new = S()
+        new.propagate(records)
+        self.assertEqual(dict(new.iterdeploy()), records)
+        new = S()
+        new.bulk_propagate(records)
+        self.assertEqual(dict(new.iterdeploy()), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+""" eviction of the child copies stored by the parents """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    parameters = {"gain":1}
+    @rec.RecFunc
+    def f(self, gain, x=0):
+        return gain+x
+
+class Detector(rec.RecObject):
+    pass
+rec.add_instances(Detector, "Amp", Amp, list(range(40)))
+
+class Bounded(Detector):
+    maxcopies = 4
+
+
+def touch(det, n=40):
+    for i in range(n):
+        getattr(det, "amp%d"%i)["gain"]
+
+
+@unittest.skipUnless(rec._REFCOUNTS, "eviction relies on the CPython reference counts")
+class TestEvict(unittest.TestCase):
+    def test_unused_copies(self):
+        det = Detector(top=1)
+        touch(det)
+        self.assertEqual(rec.copy_cache_info(det)["copies"], 40)
+        self.assertEqual(rec.evict_copies(det), 40)
+        self.assertEqual(rec.copy_cache_info(det)["copies"], 0)
+        self.assertEqual((det.amp3["top"], det.amp3["gain"]), (1, 1))
+
+    def test_used_copies_are_kept(self):
+        det = Detector(top=1)
+        held = det.amp3
+        det.amp2["v"] = 1
+        det.amp5.block("top")
+        f = det.amp6.f
+        f["x"] = 3
+        det.amp7.f()
+        det.amp8["gain"]
+        before = rec.copy_cache_info()
+        self.assertEqual(rec.evict_copies(det), 3)
+        info = rec.copy_cache_info(det)
+        self.assertEqual((info["copies"], info["fmros"]), (4, 1))
+        self.assertEqual(info["evicted_fmros"]-before["evicted_fmros"], 1)
+        self.assertIs(det.amp3, held)
+        self.assertEqual(det.amp2["v"], 1)
+        self.assertNotIn("top", det.amp5)
+        self.assertIs(det.amp6.f, f)
+        self.assertEqual(det.amp6.f(), 4)
+
+    def test_subscribed_copy_is_kept(self):
+        det = Detector()
+        det.amp1.subscribe(lambda changes: None)
+        self.assertEqual(rec.evict_copies(det), 0)
+
+    def test_maxcopies(self):
+        det = Bounded()
+        before = rec.copy_cache_info()["sweeps"]
+        touch(det)
+        self.assertLessEqual(rec.copy_cache_info(det)["copies"], 8)
+        self.assertGreater(rec.copy_cache_info()["sweeps"], before)
+        det = Detector()
+        touch(det)
+        self.assertEqual(rec.copy_cache_info(det)["copies"], 40)
+
+
+class TestNoRefcounts(unittest.TestCase):
+    def setUp(self):
+        self.refcounts = rec._REFCOUNTS
+        rec._REFCOUNTS = False
+
+    def tearDown(self):
+        rec._REFCOUNTS = self.refcounts
+
+    def test_nothing_evicted(self):
+        det = Detector(top=1)
+        touch(det)
+        self.assertEqual(rec.evict_copies(det), 0)
+        det = Bounded(top=1)
+        touch(det)
+        self.assertEqual(rec.copy_cache_info(det)["copies"], 40)
+        self.assertEqual(det.amp3["top"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+""" lookup cache of BaseRecObject.__gettrueitem__ """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+def deep_class(depth):
+    cl = rec.RecObject
+    for i in range(depth):
+        cl = type("Depth%d"%i, (cl,), {"parameters":{"k%d"%i:i}})
+    return cl
+
+
+class TestLookupCache(unittest.TestCase):
+    def test_write_keeps_entries_of_other_keys(self):
+        obj = deep_class(10)()
+        obj["k0"], obj["k9"]
+        lookup = obj.__lookup__
+        obj["i"] = 1
+        self.assertEqual(obj["k0"], 0)
+        self.assertIs(obj.__lookup__, lookup)
+        self.assertIn("k9", lookup.items)
+
+    def test_shadowing_write_is_seen(self):
+        obj = deep_class(10)()
+        self.assertEqual(obj["k0"], 0)
+        obj["k0"] = 5
+        self.assertEqual(obj["k0"], 5)
+        del obj["k0"]
+        self.assertEqual(obj["k0"], 0)
+
+    def test_cached_miss_is_invalidated(self):
+        obj = deep_class(5)()
+        self.assertNotIn("new", obj)
+        obj["new"] = 1
+        self.assertEqual(obj["new"], 1)
+
+    def test_write_with_stale_cache(self):
+        obj, other = deep_class(3)(), deep_class(3)()
+        self.assertEqual(obj["k0"], 0)
+        other["x"] = 1
+        obj["k0"] = 1
+        obj.propagate({"k1":2, "k2":3})
+        self.assertEqual((obj["k0"], obj["k1"], obj["k2"]), (1, 2, 3))
+
+    def test_batch_write(self):
+        class Setter(object):
+            def __rec_set__(self, obj, layer, item, value):
+                obj.locals["set_"+item] = value
+        class Child(rec.RecObject):
+            parameters = {"s":Setter(), "c":0}
+            prototypes = {"p":int}
+        class Parent(rec.RecObject):
+            child = Child()
+        parent = Parent(b=0, s=1)
+        child = parent.child
+        child.block("b")
+        child.update([("a", 1), ("s", 2), ("c", 3), ("b", 4), ("p", "5")])
+        self.assertEqual(dict(child.locals), {"a":1, "set_s":2, "c":3, "b":4, "p":5})
+        self.assertEqual(parent["b"], 0)
+        ## the class setter is found before the parent value
+        parent.child.propagate({"s":6})
+        self.assertEqual(child.locals["set_s"], 6)
+
+    def test_class_layer_change(self):
+        cl = deep_class(5)
+        obj = cl()
+        self.assertEqual((obj["k3"], obj["k4"]), (3, 4))
+        cl.__mro__[1].parameters["k3"] = 30
+        self.assertEqual(obj["k3"], 30)
+        cl.parameters["k3"] = 33
+        self.assertEqual((obj["k3"], obj["k4"]), (33, 4))
+
+    def test_parent_change(self):
+        class Parent(rec.RecObject):
+            class Child(rec.RecObject):
+                parameters = {"y":0}
+            child = Child()
+        parent = Parent(x=1)
+        child = parent.child
+        self.assertEqual((child["x"], child["y"]), (1, 0))
+        parent["x"] = 2
+        parent["y"] = 3
+        self.assertEqual((child["x"], child["y"]), (2, 0))
+        child.block("x")
+        self.assertNotIn("x", child)
+
+
+if __name__ == "__main__":
+    unittest.main()
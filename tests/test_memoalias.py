@@ -0,0 +1,64 @@
+""" memoalias values and their invalidation """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+calls = []
+
+def area(o):
+    calls.append(1)
+    return o["w"]*o["height"]
+
+
+class Box(rec.RecObject):
+    parameters = {"w":2, "h":3, "height":rec.alias("h"), "area":rec.memoalias(area)}
+    class Lid(rec.RecObject):
+        pass
+    lid = Lid()
+
+
+class TestMemoalias(unittest.TestCase):
+    def setUp(self):
+        del calls[:]
+        self.box = Box()
+
+    def test_memoized(self):
+        self.assertEqual(self.box["area"], 6)
+        self.assertEqual(self.box["area"], 6)
+        self.assertEqual(len(calls), 1)
+
+    def test_unrelated_write(self):
+        self.box["area"]
+        self.box["depth"] = 4
+        self.assertEqual(self.box["area"], 6)
+        self.assertEqual(len(calls), 1)
+
+    def test_write_to_alias_target(self):
+        self.assertEqual(self.box["area"], 6)
+        self.box["h"] = 5
+        self.assertEqual(self.box["area"], 10)
+        self.assertEqual(len(calls), 2)
+
+    def test_write_to_parent(self):
+        box = Box(w=2, h=3, height=rec.alias("h"), area=rec.memoalias(area))
+        lid = box.lid
+        self.assertEqual(lid["area"], 6)
+        box["w"] = 4
+        self.assertEqual(lid["area"], 12)
+        lid["h"] = 1
+        self.assertEqual(lid["area"], 4)
+        self.assertEqual(box["area"], 12)
+
+    def test_per_object(self):
+        other = Box(w=10)
+        self.assertEqual(self.box["area"], 6)
+        self.assertEqual(other["area"], 30)
+        self.assertEqual(self.box["area"], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
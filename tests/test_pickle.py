@@ -0,0 +1,109 @@
+""" pickling of RecObject trees """
+import os
+import sys
+import copy
+import pickle
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    parameters = {"gain":1}
+    @rec.RecFunc
+    def f(self, gain, offset=0):
+        return gain+offset
+
+class Det(rec.RecObject):
+    parameters = {"offset":0}
+    amp = Amp(gain=3)
+
+class Top(rec.RecObject):
+    det = Det()
+
+class Slot(rec.SlotRecObject):
+    parameters = {"s":1}
+
+Tree = rec.build_rec_class("Tree", [("Det", list(range(20))), ("Amp", list(range(10)))])
+
+
+def filled_tree():
+    tree = Tree(x=1)
+    for i, det in enumerate(tree.iter_det()):
+        for j, amp in enumerate(det.iter_amp()):
+            amp["key"] = (i, j)
+    return tree
+
+
+class TestPickle(unittest.TestCase):
+    def test_tree(self):
+        top = Top(x=1)
+        top.det["offset"] = 5
+        top.det.amp["v"] = 7
+        top.det.amp.block("x")
+        top.det.amp.f["offset"] = 11
+        for protocol in (0, 2):
+            new = pickle.loads(pickle.dumps(top, protocol))
+            amp = new.det.amp
+            self.assertEqual((new["x"], new.det["offset"], amp["v"], amp["gain"]), (1, 5, 7, 3))
+            self.assertIs(amp.get_parent(), new.det)
+            self.assertIs(new.det.get_parent(), new)
+            self.assertIn("x", amp.blocked)
+            self.assertEqual(amp.f(), 14)
+            ## the class layers are the ones of the class, the parent layers are shared 
+            self.assertTrue(all(a is b for a, b in zip(amp.__imro__[2:], Amp.__class_imro__)))
+            self.assertIs(amp.__imro__[-1], new.__imro__[0])
+            new["y"] = 2
+            self.assertEqual(amp["y"], 2)
+
+    def test_child_is_detached(self):
+        top = Top(x=1)
+        top.det["offset"] = 5
+        top.det.amp["v"] = 7
+        amp = pickle.loads(pickle.dumps(top.det.amp, 2))
+        self.assertIsNone(amp.get_parent())
+        self.assertEqual((amp["v"], amp["gain"], amp["offset"], amp["x"]), (7, 3, 5, 1))
+        self.assertEqual(amp.f(), 8)
+
+    def test_leaf_pickle_size(self):
+        tree = filled_tree()
+        leaf = tree.det3.amp4
+        self.assertLess(len(pickle.dumps(leaf, 2))*20, len(pickle.dumps(tree, 2)))
+        new = pickle.loads(pickle.dumps(leaf, 2))
+        self.assertEqual((new["key"], new["x"]), ((3, 4), 1))
+
+    def test_slots(self):
+        obj = Slot(q=1)
+        obj.block("z")
+        new = pickle.loads(pickle.dumps(obj, 2))
+        self.assertEqual((new["q"], new["s"]), (1, 1))
+        self.assertIn("z", new.blocked)
+
+    def test_build_rec_class(self):
+        tree = filled_tree()
+        new = pickle.loads(pickle.dumps(tree, 2))
+        self.assertIs(new.__class__, Tree)
+        self.assertIs(new.det2.amp3.__class__, Tree.Amp)
+        self.assertEqual(sorted(new.iterdeploy()), sorted(tree.iterdeploy()))
+
+    def test_build_rec_class_other_process(self):
+        ## the hierarchy is rebuilt in a process which did not build it
+        data = pickle.dumps(filled_tree().det5.amp1, 0)
+        code = ("import sys, pickle; sys.path.insert(0, %r); import recursive; "
+                "amp = pickle.loads(sys.stdin.read()); "
+                "print('%%s %%s %%s'%%(amp.__class__.__name__, amp['key'], amp['x']))")%ROOT
+        p = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        out, _ = p.communicate(data)
+        self.assertEqual(out.split(), ["Amp", "(5,", "1)", "1"])
+
+    def test_copy_is_shallow(self):
+        top = Top()
+        det = top.det
+        self.assertIs(copy.copy(det).__imro__, det.__imro__)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+""" RecFunc binding and calls """
+import gc
+import pickle
+import os
+import sys
+import weakref
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Obj(rec.RecObject):
+    parameters = {"a":1, "b":2}
+    @rec.RecFunc
+    def f(self, a, b=0):
+        return a+b
+
+
+class Amp(rec.RecObject):
+    parameters = {"gain":1}
+    @rec.RecFunc
+    def scaled(self, gain, x=1):
+        return gain*x
+
+class Detector(rec.RecObject):
+    pass
+rec.add_instances(Detector, "Amp", Amp, [0, 1, 2])
+
+
+class TestBoundInstances(unittest.TestCase):
+    def test_call(self):
+        obj = Obj()
+        self.assertEqual(obj.f(), 3)
+        self.assertEqual(obj.f(b=10), 11)
+
+    def test_held_instance_is_reused(self):
+        obj = Obj()
+        f = obj.f
+        self.assertIs(obj.f, f)
+        f["a"] = 5
+        self.assertEqual(obj.f(), 7)
+
+    def test_instance_is_cached(self):
+        obj = Obj()
+        self.assertIs(obj.f, obj.f)
+        ids = set(id(obj.f) for i in range(10))
+        self.assertEqual(len(ids), 1)
+
+    def test_instance_does_not_keep_the_object(self):
+        obj = Obj()
+        f = obj.f
+        del obj
+        self.assertRaises(ReferenceError, f)
+
+    def test_no_reference_cycle(self):
+        gc.collect()
+        gc.disable()
+        try:
+            obj = Obj()
+            obj.f()
+            ref = weakref.ref(obj)
+            del obj
+            self.assertIsNone(ref())
+        finally:
+            gc.enable()
+
+    def test_copies_have_their_own_instances(self):
+        class Child(rec.RecObject):
+            f = Obj.__dict__["f"]
+        class Parent(rec.RecObject):
+            child = Child()
+        p1, p2 = Parent(a=10), Parent(a=20)
+        self.assertEqual((p1.child.f(), p2.child.f()), (10, 20))
+        self.assertIs(p1.child.f.parent, p1.child)
+
+
+class TestMap(unittest.TestCase):
+    def setUp(self):
+        self.det = Detector()
+        for i, amp in enumerate(self.det.iter_amp()):
+            amp["gain"] = i+1
+
+    def test_pools(self):
+        for pool in (None, "thread", "process"):
+            self.assertEqual(self.det.iter_amp().map("scaled", kwargs={"x":10}, pool=pool),
+                             [10, 20, 30])
+
+    def test_process_errors_are_reported(self):
+        self.det.amp1["gain"] = None
+        with self.assertRaises(rec.RecMapError) as cm:
+            self.det.iter_amp().map("scaled", pool="process", processes=1)
+        error = cm.exception
+        self.assertEqual([i for i, e in error.errors], [1])
+        self.assertIsInstance(error.errors[0][1], TypeError)
+        self.assertEqual(error.results, [1, None, 3])
+
+    def test_process_unpicklable_value(self):
+        ## the children are pickled detached, a value of a sibling does not fail the call 
+        self.det.amp2["gain"] = lambda: 0
+        with self.assertRaises(rec.RecMapError) as cm:
+            self.det.iter_amp().map("scaled", pool="process", processes=1)
+        self.assertEqual([i for i, e in cm.exception.errors], [2])
+        self.assertEqual(cm.exception.results, [1, 2, None])
+
+    def test_process_build_rec_class(self):
+        Top = rec.build_rec_class("Top", [("Det", [0, 1, 2])], FuncClass=None)
+        Top.Det.scaled = Amp.__dict__["scaled"]
+        top = Top(gain=2)
+        self.assertEqual(top.iter_det().map("scaled", kwargs={"x":3}, pool="process", processes=1), 
+                         [6, 6, 6])
+
+    def test_process_pickling_errors_are_reported(self):
+        with self.assertRaises(rec.RecMapError) as cm:
+            self.det.iter_amp().map("scaled", kwargs={"x":lambda:0}, pool="process", processes=1)
+        self.assertEqual([type(e) for i, e in cm.exception.errors], [pickle.PicklingError]*3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+""" bounded repr of RecObjects and of their values """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Buffer(object):
+    """ value with a costly repr """
+    reprs = 0
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def __repr__(self):
+        Buffer.reprs += 1
+        return "Buffer(%d)"%self.nbytes
+
+
+class Amp(rec.RecObject):
+    pass
+
+
+class TestValueRepr(unittest.TestCase):
+    def setUp(self):
+        Buffer.reprs = 0
+
+    def test_big_unknown_value(self):
+        value = Buffer(10**6)
+        self.assertEqual(rec._short_repr(value), "<Buffer at 0x%x>"%id(value))
+        self.assertEqual(Buffer.reprs, 0)
+
+    def test_small_unknown_value(self):
+        self.assertEqual(rec._short_repr(Buffer(8)), "Buffer(8)")
+        self.assertEqual(Buffer.reprs, 1)
+
+    def test_in_container(self):
+        value = Buffer(10**6)
+        self.assertEqual(rec._short_repr([1, value]), "[1, <Buffer at 0x%x>]"%id(value))
+        self.assertEqual(Buffer.reprs, 0)
+
+    def test_scalars(self):
+        for value in (None, True, 2**70, 1.5, 1j, u"abc", "abc", rec.alias("g")):
+            self.assertEqual(rec._short_repr(value), repr(value))
+
+    def test_long_strings(self):
+        for value in ("a"*10**6, u"a"*10**6):
+            self.assertLessEqual(len(rec._short_repr(value)), rec.MAX_STRING_LEN)
+
+    def test_rec_object(self):
+        amp = Amp()
+        self.assertEqual(rec._short_repr(amp), object.__repr__(amp))
+
+    def test_repr(self):
+        amp = Amp(a=Buffer(10**6), b=1)
+        self.assertIn("'b' : 1", repr(amp))
+        self.assertIn("<Buffer at ", repr(amp))
+        self.assertEqual(Buffer.reprs, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+""" select and find over the children """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    parameters = {"gain":1}
+
+class Detector(rec.RecObject):
+    pass
+rec.add_instances(Detector, "Amp", Amp, list(range(12)))
+
+
+class TestSelect(unittest.TestCase):
+    def test_natural_order(self):
+        det = Detector()
+        self.assertEqual(list(det.select("amp*")), [".amp%d"%i for i in range(12)])
+        self.assertEqual(list(det.find("gain")), [".amp%d"%i for i in range(12)])
+
+    def test_class_child_added_after_query(self):
+        class Top(rec.RecObject):
+            a = Amp()
+        class Sub(Top):
+            pass
+        top, sub = Top(), Sub()
+        self.assertEqual(list(top.select("*")), [".a"])
+        self.assertEqual(list(sub.select("*")), [".a"])
+        Top.add_class_child(Amp, "b", gain=2)
+        Top.c = Amp()
+        self.assertEqual(list(top.select("*")), [".a", ".b", ".c"])
+        self.assertEqual(list(sub.select("*")), [".a", ".b", ".c"])
+        self.assertEqual(sub.select("b")[".b"]["gain"], 2)
+        del Top.a
+        self.assertEqual(list(top.select("*")), [".b", ".c"])
+        self.assertEqual(list(sub.find("gain")), [".b", ".c"])
+
+    def test_lazy_child_added_after_query(self):
+        class Top(rec.RecObject):
+            pass
+        top = Top()
+        self.assertEqual(list(top.select("*")), [])
+        rec.add_instances(Top, "Amp", Amp, [0, 1])
+        self.assertEqual(list(top.select("amp*")), [".amp0", ".amp1"])
+
+
+class TestLaziness(unittest.TestCase):
+    def lazy(self, cl):
+        return sum(isinstance(v, rec.LazyRecChild) for v in cl.__dict__.values())
+
+    def test_glob_binds_the_matches_only(self):
+        class Top(rec.RecObject):
+            pass
+        rec.add_instances(Top, "Amp", Amp, list(range(2000)))
+        top = Top()
+        self.assertEqual(list(top.select(".amp1[0-3]")), [".amp10", ".amp11", ".amp12", ".amp13"])
+        self.assertEqual(self.lazy(Top), 1996)
+        self.assertEqual(rec.copy_cache_info(top)["copies"], 4)
+
+    def test_double_star_skips_leaves(self):
+        class Group(rec.RecObject):
+            pass
+        rec.add_instances(Group, "Amp", Amp, list(range(3)))
+        class Top(rec.RecObject):
+            pass
+        rec.add_instances(Top, "Amp", Amp, list(range(100)))
+        rec.add_instances(Top, "Group", Group, [0, 1])
+        top = Top()
+        self.assertEqual(list(top.select("**.amp2")), [".amp2", ".group0.amp2", ".group1.amp2"])
+        self.assertEqual(self.lazy(Top), 99)
+        self.assertEqual(len(list(top.select("**"))), 1+100+2+6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+""" SharedParameters, parameter layer in shared memory """
+import gc
+import os
+import sys
+import pickle
+import multiprocessing
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Det(rec.RecObject):
+    parameters = {"name":"det"}
+
+
+def _read_gain(shared):
+    return shared["gain"], shared.bind(Det())["gain"]
+
+
+class TestSharedParameters(unittest.TestCase):
+    def setUp(self):
+        self.shared = rec.SharedParameters.create({"gain":1.5, "name":"shared"}, 
+                                                  keys=["offset", "label", "data"])
+
+    def tearDown(self):
+        self.shared.close()
+        self.shared.unlink()
+
+    def test_values(self):
+        shared = self.shared
+        self.assertEqual(shared["gain"], 1.5)
+        self.assertNotIn("offset", shared)
+        self.assertRaises(KeyError, shared.__getitem__, "offset")
+        shared.update(offset=3, label=u"été", data={"a":[1, 2]})
+        self.assertEqual((shared["offset"], shared["label"], shared["data"]), 
+                         (3, u"été", {"a":[1, 2]}))
+        self.assertEqual(len(shared), 5)
+        del shared["offset"]
+        self.assertEqual(shared.get("offset", 0), 0)
+        self.assertRaises(KeyError, shared.__setitem__, "unknown", 1)
+
+    def test_attach_by_name(self):
+        other = rec.SharedParameters(self.shared.name)
+        try:
+            self.shared["gain"] = 2.5
+            self.assertEqual(other["gain"], 2.5)
+            other["label"] = "from other"
+            self.assertEqual(self.shared["label"], "from other")
+        finally:
+            other.close()
+
+    def test_pickle_by_name(self):
+        data = pickle.dumps(self.shared, 2)
+        self.assertLess(len(data), 200)
+        other = pickle.loads(data)
+        try:
+            self.assertEqual(other["gain"], 1.5)
+        finally:
+            other.close()
+
+    def test_heap_full(self):
+        self.assertRaises(ValueError, self.shared.__setitem__, "data", "x"*(1<<17))
+        self.assertEqual(self.shared["gain"], 1.5)
+
+    def test_bind(self):
+        det = self.shared.bind(Det())
+        self.assertEqual((det["gain"], det["name"]), (1.5, "det"))
+        self.shared["gain"] = 3.0
+        self.assertEqual(det["gain"], 3.0)
+
+    def test_bound_reads_are_cached(self):
+        det = self.shared.bind(Det(x=1))
+        det.block("x")
+        self.assertEqual((det["name"], det["gain"], det["x"]), ("det", 1.5, 1))
+        ## the keys found before the shared layer are cached, not the shared ones
+        self.assertEqual(sorted(k for k, f in det.__lookup__.items.items() if f), ["name", "x"])
+        other = rec.SharedParameters(self.shared.name)
+        try:
+            other["gain"] = 2.5
+            other["offset"] = 1
+            self.assertEqual((det["gain"], det["offset"]), (2.5, 1))
+        finally:
+            other.close()
+
+    def test_bind_temporary_objects(self):
+        ## copies are not cached by the id of temporary objects
+        first = self.shared.bind(Det(name="first"))
+        self.assertEqual(first["name"], "first")
+        del first
+        gc.collect()
+        self.assertEqual(self.shared.bind(Det(name="second"))["name"], "second")
+        self.assertFalse(getattr(self.shared, "__orecobj__", None))
+
+    def test_other_process(self):
+        pool = multiprocessing.Pool(1)
+        try:
+            self.shared["gain"] = 4.0
+            self.assertEqual(pool.apply(_read_gain, (self.shared,)), (4.0, 4.0))
+        finally:
+            pool.close()
+            pool.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
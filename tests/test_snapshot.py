@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+""" binary snapshots written by save_snapshot """
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    pass
+
+class Det(rec.RecObject):
+    amp = Amp()
+
+class Top(rec.RecObject):
+    pass
+rec.add_instances(Top, "Det", Det, list(range(50)))
+
+
+VALUES = {"none":None, "true":True, "false":False, "int":-3, "big":2**70, 
+          "float":1.5, "str":"abc", "unicode":u"été", "list":[1, (2, 3)]}
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "snap.bin")
+        self.top = Top(name="top")
+        for i, det in enumerate(self.top.iter_det()):
+            det["index"] = i
+        self.top.det7.amp.update(VALUES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def snapshot(self):
+        rec.save_snapshot(self.top, self.filename)
+        return rec.load_snapshot(self.filename)
+
+    def test_values(self):
+        with self.snapshot() as snap:
+            amp = snap.root.det7.amp
+            self.assertEqual(dict(amp.items()), VALUES)
+            self.assertEqual(amp["unicode"], u"été")
+            self.assertEqual(snap.root["name"], "top")
+            self.assertEqual(amp.path, ".det7.amp")
+
+    def test_child_lookup(self):
+        with self.snapshot() as snap:
+            root = snap.root
+            self.assertEqual([root.child("det%d"%i)["index"] for i in range(50)], list(range(50)))
+            self.assertEqual(len(list(root.children())), 50)
+            self.assertRaises(KeyError, root.child, "det50")
+            self.assertRaises(AttributeError, getattr, root, "det50")
+            self.assertRaises(KeyError, root.det3.child, "zzz")
+
+    def test_iterdeploy(self):
+        with self.snapshot() as snap:
+            self.assertEqual(sorted(snap.iterdeploy()), sorted(self.top.iterdeploy()))
+
+    def test_deploy_round_trip(self):
+        with self.snapshot() as snap:
+            deployed = snap.deploy()
+            self.assertEqual(deployed[".det7"][".amp"], VALUES)
+            self.assertEqual(deployed[".det3"]["index"], 3)
+            new = Top()
+            new.propagate(deployed)
+            self.assertEqual(sorted(new.iterdeploy()), sorted(self.top.iterdeploy()))
+            new = Top()
+            snap.apply(new)
+            self.assertEqual(new.det7.amp["big"], 2**70)
+
+    def test_apply_keeps_key_types(self):
+        keys = {"007":1, "1.5":2, "3":3, 3:4, 1.5:5}
+        self.top.det2.amp.update(keys)
+        with self.snapshot() as snap:
+            new = Top()
+            snap.apply(new)
+            self.assertEqual(dict(new.det2.amp.locals), keys)
+            self.assertEqual(new.det3["index"], 3)
+
+    def test_not_a_snapshot(self):
+        with open(self.filename, "wb") as f:
+            f.write(b"\0"*64)
+        self.assertRaises(ValueError, rec.load_snapshot, self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
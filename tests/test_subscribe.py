@@ -0,0 +1,112 @@
+""" change events sent to the subscribers """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+MISSING = rec.RecChange.MISSING
+
+
+class Amp(rec.RecObject):
+    pass
+
+class Det(rec.RecObject):
+    amp = Amp()
+    pre = Amp()
+
+
+class TestSubscribe(unittest.TestCase):
+    def setUp(self):
+        self.det = Det()
+        self.det.amp, self.det.pre
+        self.calls = []
+        self.det.subscribe(self.calls.append)
+
+    def tearDown(self):
+        self.det.unsubscribe(self.calls.append)
+
+    def events(self):
+        return sorted(e for call in self.calls for e in call)
+
+    def test_fan_out(self):
+        self.det["gain"] = 1
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.events(), [("gain", "", MISSING, 1),
+                                         ("gain", ".amp", MISSING, 1),
+                                         ("gain", ".pre", MISSING, 1)])
+
+    def test_shadowed_by_child_local(self):
+        self.det.amp["gain"] = 5
+        del self.calls[:]
+        self.det["gain"] = 1
+        self.assertEqual(self.events(), [("gain", "", MISSING, 1),
+                                         ("gain", ".pre", MISSING, 1)])
+        del self.calls[:]
+        del self.det.amp["gain"]
+        self.assertEqual(self.events(), [("gain", ".amp", 5, 1)])
+
+    def test_batch_coalesces(self):
+        with rec.batch_changes():
+            self.det["gain"] = 1
+            self.det["gain"] = 2
+            self.det.amp["offset"] = 3
+            self.assertEqual(self.calls, [])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.events(), [("gain", "", MISSING, 2),
+                                         ("gain", ".amp", MISSING, 2),
+                                         ("gain", ".pre", MISSING, 2),
+                                         ("offset", ".amp", MISSING, 3)])
+
+    def test_batch_back_to_old_value(self):
+        self.det["gain"] = 1
+        del self.calls[:]
+        with rec.batch_changes():
+            self.det["gain"] = 2
+            self.det["gain"] = 1
+        self.assertEqual(self.calls, [])
+
+    def test_keys(self):
+        calls = []
+        self.det.amp.subscribe(calls.append, keys=["offset"])
+        self.det["gain"] = 1
+        self.det["offset"] = 2
+        self.assertEqual(calls, [[("offset", "", MISSING, 2)]])
+
+    def test_unsubscribe(self):
+        self.det.unsubscribe(self.calls.append)
+        self.det["gain"] = 1
+        self.det.amp["gain"] = 2
+        self.assertEqual(self.calls, [])
+
+    def test_unsubscribe_keeps_others(self):
+        calls = []
+        self.det.subscribe(calls.append)
+        self.det.unsubscribe(self.calls.append)
+        self.det["gain"] = 1
+        self.assertEqual(self.calls, [])
+        self.assertEqual(len(calls), 1)
+        self.det.unsubscribe(calls.append)
+
+    def test_block_release(self):
+        self.det["gain"] = 1
+        del self.calls[:]
+        self.det.amp.block("gain")
+        self.assertEqual(self.events(), [("gain", ".amp", 1, MISSING)])
+        del self.calls[:]
+        self.det["gain"] = 2
+        self.assertEqual(self.events(), [("gain", "", 1, 2),
+                                         ("gain", ".pre", 1, 2)])
+        del self.calls[:]
+        self.det.amp.release("gain")
+        self.assertEqual(self.events(), [("gain", ".amp", MISSING, 2)])
+
+    def test_block_unset_key(self):
+        self.det.amp.block("gain")
+        self.det.amp.release("gain")
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
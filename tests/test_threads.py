@@ -0,0 +1,111 @@
+""" thread-safe mode """
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class TestThreadSafe(unittest.TestCase):
+    def setUp(self):
+        self.previous = rec.set_threadsafe(True)
+
+    def tearDown(self):
+        rec.set_threadsafe(self.previous)
+
+    def test_read_transaction_sees_whole_updates(self):
+        obj = rec.RecObject(x=0, y=0)
+        stop = []
+        def write():
+            i = 0
+            while not stop:
+                i += 1
+                obj.update(x=i, y=i)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(2000):
+                with rec.read_transaction():
+                    x, y = obj["x"], obj["y"]
+                self.assertEqual(x, y)
+        finally:
+            stop.append(True)
+            writer.join()
+
+    def test_read_transactions_run_in_parallel(self):
+        obj = rec.RecObject(x=0)
+        entered = threading.Event()
+        def read():
+            with rec.read_transaction():
+                obj["x"]
+                entered.set()
+        with rec.read_transaction():
+            reader = threading.Thread(target=read)
+            reader.start()
+            entered.wait(5)
+            self.assertTrue(entered.is_set())
+        reader.join()
+
+    def test_read_transaction_excludes_writers(self):
+        obj = rec.RecObject(x=0)
+        writer = threading.Thread(target=lambda: obj.__setitem__("x", 1))
+        with rec.read_transaction():
+            writer.start()
+            writer.join(0.1)
+            self.assertTrue(writer.is_alive())
+            self.assertEqual(obj["x"], 0)
+            self.assertRaises(RuntimeError, obj.__setitem__, "x", 2)
+        writer.join()
+        self.assertEqual(obj["x"], 1)
+
+    def test_concurrent_binding_returns_one_copy(self):
+        class Parent(rec.RecObject):
+            class Child(rec.RecObject):
+                pass
+            child = Child()
+        parent = Parent(x=1)
+        children = []
+        threads = [threading.Thread(target=lambda: children.append(parent.child)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(c is children[0] for c in children))
+
+    def test_mode_switch(self):
+        self.assertTrue(rec.set_threadsafe(False))
+        self.assertFalse(rec.set_threadsafe(True))
+
+
+class HookDict(rec.RecDict):
+    """ class layer calling the `hooks` once when looked up """
+    hooks = []
+    def __getitem__(self, item):
+        while self.hooks:
+            self.hooks.pop()()
+        return rec.RecDict.__getitem__(self, item)
+
+class Hooked(rec.RecObject):
+    parameters = HookDict(x=0)
+
+
+class TestLookupRace(unittest.TestCase):
+    def test_stale_entry_is_not_cached(self):
+        ## a writer and an other reader run while a read walks the layers 
+        obj = Hooked()
+        obj["y"] = 0
+        obj["y"]
+        seen = []
+        def interleave():
+            obj["x"] = 1
+            seen.append(obj["x"])
+        HookDict.hooks.append(interleave)
+        self.assertEqual(obj["x"], 0)
+        self.assertEqual(seen, [1])
+        self.assertEqual(obj["x"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
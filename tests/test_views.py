@@ -0,0 +1,86 @@
+""" keys, values and items views of RecObjects """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import recursive as rec
+
+
+class Amp(rec.RecObject):
+    parameters = {"g":1, "o":0}
+
+class Det(rec.RecObject):
+    amp = Amp()
+
+
+class TestViews(unittest.TestCase):
+    def setUp(self):
+        self.det = Det(g=2, v=[1])
+        self.amp = self.det.amp
+        self.amp["o"] = 3
+
+    def test_len_dedup(self):
+        ## g and o are in two layers
+        self.assertEqual(sorted(self.amp.viewkeys()), ["g", "o", "v"])
+        self.assertEqual(len(self.amp.viewkeys()), 3)
+        self.assertEqual(len(self.amp.viewitems()), 3)
+        self.assertEqual(len(self.amp.viewvalues()), 3)
+        self.amp.block("v")
+        self.addCleanup(self.amp.release, "v")
+        self.assertEqual(len(self.amp.viewkeys()), 2)
+
+    def test_lazy(self):
+        keys = self.amp.viewkeys()
+        self.det["x"] = 1
+        self.assertIn("x", keys)
+        self.assertEqual(len(keys), 4)
+
+    def test_keys_contains(self):
+        keys = self.amp.viewkeys()
+        self.assertIn("g", keys)
+        self.assertIn("v", keys)
+        self.assertNotIn("x", keys)
+
+    def test_items_contains(self):
+        items = self.amp.viewitems()
+        self.assertIn(("o", 3), items)
+        self.assertIn(("g", 1), items)
+        self.assertNotIn(("g", 2), items)
+        self.assertIn(("v", [1]), items)
+        self.assertNotIn(("x", 1), items)
+
+    def test_items_true_values(self):
+        a = rec.alias("g")
+        self.amp["h"] = a
+        self.assertIn(("h", a), self.amp.viewitems())
+        self.assertIn(a, self.amp.viewvalues())
+
+    def test_values_contains(self):
+        values = self.amp.viewvalues()
+        self.assertIn(3, values)
+        self.assertIn([1], values)
+        self.assertNotIn(2, values)
+
+    def test_keys_set_operations(self):
+        keys = self.amp.viewkeys()
+        self.assertEqual(keys & {"g", "x"}, {"g"})
+        self.assertEqual(keys | {"x"}, {"g", "o", "v", "x"})
+        self.assertEqual(keys - {"g"}, {"o", "v"})
+        self.assertEqual(keys ^ {"g", "x"}, {"o", "v", "x"})
+        self.assertTrue(keys.isdisjoint({"x"}))
+        self.assertFalse(keys.isdisjoint({"o"}))
+        self.assertEqual(keys, {"g", "o", "v"})
+        self.assertTrue(keys <= {"g", "o", "v", "x"})
+
+    def test_items_set_operations(self):
+        del self.det["v"]
+        items = self.amp.viewitems()
+        self.assertEqual(items & {("g", 1), ("g", 2)}, {("g", 1)})
+        self.assertEqual(items - {("g", 1)}, {("o", 3)})
+        self.assertTrue(items.isdisjoint({("g", 2)}))
+        self.assertEqual(items, {("g", 1), ("o", 3)})
+
+
+if __name__ == "__main__":
+    unittest.main()